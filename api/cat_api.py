@@ -1,28 +1,134 @@
-from datetime import timedelta
+import asyncio
+import time
 
-from requests_cache import CachedSession
+from api.http_client import HttpClient
 
 from logs.log import log
 
+from config import CAT_BASE, CAT_POOL_SIZE, CAT_POOL_LOW_WATER, CAT_REFILL_BACKOFF, BOT_ICON
+
 from secret import CAT_KEY
 
+class CatPool:
+    """
+    Ring buffer of cat image urls. Urls are handed out in turn, and once every one has been seen
+    the ring starts over, so taking a url never waits on the network. `needs_refill` reports when
+    fewer than `low_water` unseen urls remain.
+    """
+
+    def __init__(self, low_water: int):
+        self.low_water = low_water
+        self._urls: list[str] = []
+        self._cursor = 0
+        self._unseen = 0
+
+    def __len__(self) -> int:
+        return len(self._urls)
+
+    @property
+    def needs_refill(self) -> bool:
+        return self._unseen < self.low_water
+
+    def fill(self, urls: list[str]) -> None:
+        self._urls = urls
+        self._cursor = 0
+        self._unseen = len(urls)
+
+    def take(self) -> str:
+        if not self._urls:
+            return None
+        url = self._urls[self._cursor % len(self._urls)]
+        self._cursor += 1
+        self._unseen = max(0, self._unseen - 1)
+        return url
+
 class CatApi:
 
     source = "The Cat Api"
+    pool = CatPool(low_water=CAT_POOL_LOW_WATER)
+    _refill: asyncio.Task = None
+    # when the last refill failed, `None` once one succeeds
+    _failed_at: float = None
 
     @classmethod
     def extract(cls) -> str:
+        url = cls.pool.take()
+        if url is not None:
+            return {
+                'url': url,
+                'source': cls.source
+            }
+
         try:
-            response = CachedSession("api-cache", expire_after=timedelta(hours=4)).get(f"https://api.thecatapi.com/v1/images/search?limit=1&api_key={CAT_KEY}")
+            status, data = HttpClient.get_json_blocking(
+                f"{CAT_BASE}/images/search",
+                params={'limit': 1, 'api_key': CAT_KEY}
+            )
         except Exception as err:
-            log(err)
+            log(err, level="ERROR")
+            status, data = None, None
+
+        if status == 200 and data:
             return {
-                'url': "attachment://bot_icon.jpg",
+                'url': data[0]['url'],
                 'source': cls.source
             }
+        return {
+            'url': f"attachment://{BOT_ICON}",
+            'source': cls.source
+        }
 
-        if response.status_code == 200:
+    @classmethod
+    async def fill(cls) -> None:
+        """
+        Refills the pool with a single request for `CAT_POOL_SIZE` images.
+        """
+
+        try:
+            status, data = await HttpClient.get_json(
+                'cat',
+                f"{CAT_BASE}/images/search",
+                params={'limit': CAT_POOL_SIZE, 'api_key': CAT_KEY}
+            )
+        except Exception as err:
+            log(err, level="ERROR")
+            cls._failed_at = time.monotonic()
+            return None
+
+        if status == 200 and data:
+            cls.pool.fill([image['url'] for image in data])
+            cls._failed_at = None
+        else:
+            log(f"cat api replied {status} - in CatApi.fill", level="ERROR")
+            cls._failed_at = time.monotonic()
+
+    @classmethod
+    def refill_soon(cls) -> None:
+        # at most one refill in flight, and none for a while after one fails
+        if cls._failed_at is not None and time.monotonic() - cls._failed_at < CAT_REFILL_BACKOFF:
+            return None
+        if cls._refill is None or cls._refill.done():
+            cls._refill = asyncio.create_task(cls.fill())
+
+    @classmethod
+    async def extract_async(cls) -> str:
+        # only the very first call waits for the pool to fill, after a failed refill
+        # callers get the fallback image right away while the api is retried in the background
+        if len(cls.pool) == 0 and cls._failed_at is None:
+            cls.refill_soon()
+            await asyncio.shield(cls._refill)
+
+        url = cls.pool.take()
+        if cls.pool.needs_refill:
+            cls.refill_soon()
+
+        if url is None:
             return {
-                'url': response.json()[0]['url'],
+                'url': f"attachment://{BOT_ICON}",
                 'source': cls.source
-            }
\ No newline at end of file
+            }
+
+        return {
+            'url': url,
+            'source': cls.source
+        }
@@ -0,0 +1,228 @@
+import asyncio
+import datetime
+import json
+import sqlite3
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from db.cache import TTLCache
+from db.database import ConnectionManager
+
+from logs.log import log
+
+class ForecastCache:
+    """
+    Two tier cache of parsed forecast summaries, keyed by canonical location and the local date
+    the forecast is for. Parsed summaries are kept in memory, and an sqlite file keeps them
+    across restarts. Entries expire after `max_age` seconds or at local midnight, whichever
+    comes first, so yesterday's forecast is never served.
+
+    The disk tier runs on its own thread: `get_async` reads it there, and `set` writes behind.
+    Rows beyond `disk_size` are pruned at most every `prune_interval` seconds.
+    """
+
+    def __init__(self, dbfile: str, memory_size: int, disk_size: int, max_age: float, prune_interval: float = 60):
+        self.max_age = max_age
+        self.disk_size = disk_size
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._memory = TTLCache(maxsize=memory_size, ttl=max_age)
+        # timezone of each location, needed to tell which day is "today" there
+        self._zones: dict[str, str] = {}
+        # the file is opened on first use, keeping it off the import path
+        self.dbfile = dbfile
+        self._connections: ConnectionManager = None
+        self._setup_lock = threading.Lock()
+        # one thread keeps writes in order and off the event loop
+        self._disk = ThreadPoolExecutor(max_workers=1, thread_name_prefix="forecast-cache")
+        self.prune_interval = prune_interval
+        self._pruned = float("-inf")
+
+    @property
+    def _db(self) -> ConnectionManager:
+        if self._connections is None:
+            with self._setup_lock:
+                if self._connections is None:
+                    connections = ConnectionManager(self.dbfile, readers=2)
+                    self.create_table(connections)
+                    self._connections = connections
+        return self._connections
+
+    def create_table(self, connections: ConnectionManager) -> None:
+        forecasts_table = """
+            CREATE TABLE IF NOT EXISTS
+                forecasts (
+                    location TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    tz TEXT NOT NULL,
+                    summary TEXT NOT NULL,
+                    expires REAL NOT NULL,
+                    PRIMARY KEY (location, day)
+                );
+        """
+        try:
+            with connections.session(write=True) as db:
+                db.execute(forecasts_table)
+        except sqlite3.Error as err:
+            log(f"{err} - in ForecastCache.create_table", level="ERROR")
+
+    @staticmethod
+    def zone(tz: str) -> datetime.tzinfo:
+        try:
+            return ZoneInfo(tz)
+        except (ZoneInfoNotFoundError, ValueError):
+            return datetime.timezone.utc
+
+    @staticmethod
+    def today(tz: str) -> str:
+        return datetime.datetime.now(ForecastCache.zone(tz)).date().isoformat()
+
+    def get(self, location: str) -> dict:
+        """
+        Returns the cached summary of today's forecast for `location`, or `None`. Blocks on the
+        disk tier when memory misses, so use `get_async` on the event loop.
+
+        Parameters
+        ----------
+        location: `str`
+            Canonical location.
+        """
+
+        summary = self._get_memory(location)
+        if summary is not None:
+            return summary
+        return self._get_disk(location)
+
+    async def get_async(self, location: str) -> dict:
+        """
+        Awaitable `get`. Memory hits return without leaving the event loop.
+        """
+
+        summary = self._get_memory(location)
+        if summary is not None:
+            return summary
+        return await asyncio.get_running_loop().run_in_executor(self._disk, self._get_disk, location)
+
+    def _get_memory(self, location: str) -> dict:
+        tz = self._zones.get(location)
+        if tz is not None:
+            summary = self._memory.get((location, ForecastCache.today(tz)))
+            if summary is not None:
+                self.memory_hits += 1
+                return summary
+        return None
+
+    def _get_disk(self, location: str) -> dict:
+        find_forecast = """
+            SELECT
+                day,
+                tz,
+                summary,
+                expires
+            FROM
+                forecasts
+            WHERE
+                location = ?
+            AND
+                expires > ?
+            ORDER BY
+                day DESC
+            LIMIT 1
+        """
+        row = None
+        try:
+            with self._db.session() as db:
+                db.execute(find_forecast, (location, time.time()))
+                row = db.fetchone()
+        except sqlite3.Error as err:
+            log(f"{err} - in ForecastCache.get(location={location})", level="ERROR")
+
+        if row is None or row[0] != ForecastCache.today(row[1]):
+            self.misses += 1
+            return None
+
+        day, tz, summary, expires = row
+        summary = json.loads(summary)
+        self._zones[location] = tz
+        self._memory.set((location, day), summary, ttl=expires - time.time())
+        self.disk_hits += 1
+        return summary
+
+    def set(self, location: str, day: str, tz: str, summary: dict) -> None:
+        """
+        Stores the summary of `location`'s forecast for `day` in memory right away, and on
+        disk from the cache's own thread.
+
+        Parameters
+        ----------
+        location: `str`
+            Canonical location.
+        day: `str`
+            Local date of the forecast, as YYYY-MM-DD.
+        tz: `str`
+            IANA timezone of the location.
+        summary: `dict`
+        """
+
+        # a payload fetched just before local midnight can already be for yesterday
+        if day != ForecastCache.today(tz):
+            return None
+
+        midnight = datetime.datetime.combine(
+            datetime.date.fromisoformat(day) + datetime.timedelta(days=1),
+            datetime.time(),
+            tzinfo=ForecastCache.zone(tz)
+        ).timestamp()
+        expires = min(time.time() + self.max_age, midnight)
+
+        self._zones[location] = tz
+        self._memory.set((location, day), summary, ttl=expires - time.time())
+        self._disk.submit(self._set_disk, location, day, tz, summary, expires)
+
+    def _set_disk(self, location: str, day: str, tz: str, summary: dict, expires: float) -> None:
+        store_forecast = """
+            INSERT OR REPLACE INTO forecasts
+                (location, day, tz, summary, expires)
+                VALUES(?, ?, ?, ?, ?)
+        """
+        # drop expired rows, then the soonest to expire beyond `disk_size`
+        prune_forecasts = """
+            DELETE FROM
+                forecasts
+            WHERE
+                expires <= ?
+            OR
+                rowid IN (
+                    SELECT
+                        rowid
+                    FROM
+                        forecasts
+                    ORDER BY
+                        expires DESC
+                    LIMIT -1 OFFSET ?
+                )
+        """
+        try:
+            with self._db.session(write=True) as db:
+                db.execute(store_forecast, (location, day, tz, json.dumps(summary), expires))
+                if time.monotonic() - self._pruned > self.prune_interval:
+                    db.execute(prune_forecasts, (time.time(), self.disk_size))
+                    self._pruned = time.monotonic()
+        except sqlite3.Error as err:
+            log(f"{err} - in ForecastCache.set(location={location}, day={day})", level="ERROR")
+
+    @property
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'memory_size': len(self._memory),
+            'hit_rate': (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0
+        }
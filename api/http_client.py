@@ -0,0 +1,93 @@
+import asyncio
+import threading
+
+import aiohttp
+
+from config import HTTP_TIMEOUT, HTTP_CONNECT_TIMEOUT, HTTP_POOL_SIZE, HTTP_KEEPALIVE, HTTP_UPSTREAM_LIMITS
+
+class UpstreamError(Exception):
+    """
+    An api could not be reached or failed to answer, as opposed to answering "not found".
+    """
+
+class HttpClient:
+    """
+    One pooled `aiohttp` session shared by every api, so connections stay alive between requests.
+    The blocking `get_json_blocking`, for callers off the event loop, shares one `requests`
+    session under the same timeouts.
+    """
+
+    _session: aiohttp.ClientSession = None
+    _limits: dict[str, asyncio.Semaphore] = {}
+    _blocking_session = None
+    _blocking_lock = threading.Lock()
+
+    @classmethod
+    def session(cls) -> aiohttp.ClientSession:
+        # created lazily since a session must be made inside the running event loop
+        if cls._session is None or cls._session.closed:
+            cls._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=HTTP_POOL_SIZE, keepalive_timeout=HTTP_KEEPALIVE),
+                timeout=aiohttp.ClientTimeout(total=HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+            )
+        return cls._session
+
+    @classmethod
+    def limit(cls, upstream: str) -> asyncio.Semaphore:
+        if upstream not in cls._limits:
+            cls._limits[upstream] = asyncio.Semaphore(HTTP_UPSTREAM_LIMITS.get(upstream, HTTP_POOL_SIZE))
+        return cls._limits[upstream]
+
+    @classmethod
+    async def get_json(cls, upstream: str, url: str, params: dict = None) -> tuple[int, any]:
+        """
+        Sends a GET request and returns the status code with the decoded body, which for errors
+        is whatever the api explained them with, or `None` if the body is not JSON. Raises on
+        connection errors and timeouts.
+
+        Parameters
+        ----------
+        upstream: `str`
+            Name of the api, used to cap concurrent requests to it.
+        url: `str`
+        params: `dict`
+            Query string parameters.
+        """
+
+        async with cls.limit(upstream):
+            async with cls.session().get(url, params=params) as response:
+                try:
+                    return response.status, await response.json(content_type=None)
+                except ValueError:
+                    return response.status, None
+
+    @classmethod
+    def get_json_blocking(cls, url: str, params: dict = None) -> tuple[int, any]:
+        """
+        Blocking `get_json`. Raises on connection errors and timeouts.
+
+        Parameters
+        ----------
+        url: `str`
+        params: `dict`
+            Query string parameters.
+        """
+
+        if cls._blocking_session is None:
+            with cls._blocking_lock:
+                if cls._blocking_session is None:
+                    # only the blocking paths need requests, so it waits for first use
+                    import requests
+                    cls._blocking_session = requests.Session()
+
+        response = cls._blocking_session.get(url, params=params, timeout=(HTTP_CONNECT_TIMEOUT, HTTP_TIMEOUT))
+        try:
+            return response.status_code, response.json()
+        except ValueError:
+            return response.status_code, None
+
+    @classmethod
+    async def close(cls) -> None:
+        if cls._session is not None:
+            await cls._session.close()
+        cls._session = None
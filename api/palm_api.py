@@ -1,32 +1,144 @@
-import google.generativeai as palm
+import asyncio
+import json
+import threading
+import time
+
+from db.cache import TTLCache
 
 from secret import PALM_KEY
 
 from logs.log import log
 
-palm.configure(api_key=PALM_KEY)
+from config import PALM_BASE, PALM_CONCURRENCY, PALM_CACHE_SIZE, PALM_CACHE_TTL, PALM_MODEL_FILE, PALM_MODEL_REFRESH
 
 class PalmApi:
 
     source = "PaLM"
-    # text-bison
-    model = [m for m in palm.list_models() if 'generateText' in m.supported_generation_methods][0].name
+    # google.generativeai takes longer to import than the rest of the bot, so it waits for first use
+    _client = None
+    _client_lock = threading.Lock()
+    # text-bison, looked up on first use rather than at import
+    _model: str = None
+    _model_expires = 0.0
+    _model_lock = threading.Lock()
+
+    # replies to recent prompts, and generations already underway keyed by prompt
+    responses = TTLCache(maxsize=PALM_CACHE_SIZE, ttl=PALM_CACHE_TTL)
+    _inflight: dict[str, asyncio.Task] = {}
+    _limit: asyncio.Semaphore = None
+
+    @classmethod
+    def client(cls):
+        if cls._client is None:
+            with cls._client_lock:
+                if cls._client is None:
+                    import google.generativeai as palm
+                    if PALM_BASE:
+                        palm.configure(api_key=PALM_KEY, transport="rest", client_options={'api_endpoint': PALM_BASE})
+                    else:
+                        palm.configure(api_key=PALM_KEY)
+                    cls._client = palm
+        return cls._client
+
+    @classmethod
+    def model(cls) -> str:
+        """
+        Returns the name of the first model that supports text generation. The answer is kept on
+        disk and only asked of the api again after `PALM_MODEL_REFRESH` seconds. A stale answer
+        is still used if asking again fails.
+        """
+
+        if time.time() < cls._model_expires:
+            return cls._model
+
+        with cls._model_lock:
+            if time.time() < cls._model_expires:
+                return cls._model
+
+            saved = {}
+            try:
+                with open(PALM_MODEL_FILE) as file:
+                    saved = json.load(file)
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError) as err:
+                log(f"{err} - in PalmApi.model", level="ERROR")
+
+            if saved and time.time() - saved['fetched'] < PALM_MODEL_REFRESH:
+                cls._model, cls._model_expires = saved['name'], saved['fetched'] + PALM_MODEL_REFRESH
+                return cls._model
+
+            try:
+                name = [m for m in cls.client().list_models() if 'generateText' in m.supported_generation_methods][0].name
+            except Exception as err:
+                if not saved:
+                    raise
+                log(f"{err} - in PalmApi.model, using the saved model", level="ERROR")
+                cls._model, cls._model_expires = saved['name'], time.time() + PALM_MODEL_REFRESH
+                return cls._model
+
+            try:
+                with open(PALM_MODEL_FILE, "w") as file:
+                    json.dump({'name': name, 'fetched': time.time()}, file)
+            except OSError as err:
+                log(f"{err} - in PalmApi.model", level="ERROR")
+            cls._model, cls._model_expires = name, time.time() + PALM_MODEL_REFRESH
+            return cls._model
 
     @classmethod
     def extract(cls, **kwargs) -> str:
         prompt = kwargs['prompt']
         try:
             # default settings
-            result = palm.generate_text(
-                model=cls.model,
+            result = cls.client().generate_text(
+                model=cls.model(),
                 prompt=prompt,
                 temperature=0.5,
                 max_output_tokens=800
             )
         except Exception as err:
-            log(err)
+            log(err, level="ERROR")
+            return {}
+        # replies caught by the safety filters come back without a result
+        if not result.result:
+            log(f"PaLM returned no result - in PalmApi.extract(prompt={prompt[:40]!r})", level="WARNING")
             return {}
         return {
             'result': result.result,
             'source': cls.source
-        }
\ No newline at end of file
+        }
+
+    @classmethod
+    def is_busy(cls) -> bool:
+        return bool(cls._inflight)
+
+    @classmethod
+    async def extract_async(cls, **kwargs) -> str:
+        prompt = kwargs['prompt']
+
+        cached = cls.responses.get(prompt)
+        if cached is not None:
+            return cached
+
+        # identical prompts share one generation
+        if prompt not in cls._inflight:
+            task = asyncio.create_task(cls._generate(prompt))
+            cls._inflight[prompt] = task
+            task.add_done_callback(lambda _: cls._inflight.pop(prompt, None))
+        # shielded so one caller giving up does not cancel it for the rest
+        return await asyncio.shield(cls._inflight[prompt])
+
+    @classmethod
+    async def _generate(cls, prompt: str) -> str:
+        if cls._limit is None:
+            cls._limit = asyncio.Semaphore(PALM_CONCURRENCY)
+
+        async with cls._limit:
+            start = time.perf_counter()
+            # the client library blocks, so it runs in a worker thread
+            data = await asyncio.to_thread(cls.extract, prompt=prompt)
+            log(f"PaLM generation took {time.perf_counter() - start:.2f}s ({len(prompt)} char prompt)")
+
+        if data:
+            cls.responses.set(prompt, data)
+        return data
@@ -0,0 +1,171 @@
+import asyncio
+import json
+import os
+import uuid
+
+from collections import deque
+
+from api.palm_api import PalmApi
+
+from logs.log import log
+
+from config import MOTIVATION_PROMPT_TEMPLATE, QUOTE_POOL_FILE, QUOTE_POOL_SIZE, QUOTE_HISTORY
+
+class QuoteApi:
+    """
+    Motivational quotes generated ahead of time by `PalmApi`, each from its own random seed.
+    Quotes are kept in a file so the pool survives restarts, and recently seen quotes are
+    remembered so repeats are dropped.
+    """
+
+    source = PalmApi.source
+    quotes: deque[str] = deque()
+    # normalized text of quotes pooled or served recently, oldest first
+    history: deque[str] = deque(maxlen=QUOTE_HISTORY)
+    _seen: set[str] = set()
+    _loaded = False
+    # the one save in flight, and whether the pool changed since it took its snapshot
+    _saving: asyncio.Task = None
+    _dirty = False
+
+    @staticmethod
+    def normalize(quote: str) -> str:
+        return " ".join(quote.split()).casefold()
+
+    @staticmethod
+    def prompt() -> str:
+        return MOTIVATION_PROMPT_TEMPLATE.format(seed=uuid.uuid4().hex)
+
+    @classmethod
+    def load(cls) -> None:
+        cls._loaded = True
+        try:
+            with open(QUOTE_POOL_FILE) as file:
+                saved = json.load(file)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as err:
+            log(f"{err} - in QuoteApi.load", level="ERROR")
+            return None
+
+        cls.quotes.extend(saved['quotes'])
+        for normalized in saved['history']:
+            cls._remember(normalized)
+
+    @classmethod
+    async def save(cls) -> None:
+        snapshot = json.dumps({'quotes': list(cls.quotes), 'history': list(cls.history)})
+
+        def write() -> None:
+            # write then rename, so a crash never leaves half a file
+            with open(QUOTE_POOL_FILE + ".tmp", "w") as file:
+                file.write(snapshot)
+            os.replace(QUOTE_POOL_FILE + ".tmp", QUOTE_POOL_FILE)
+
+        try:
+            await asyncio.to_thread(write)
+        except OSError as err:
+            log(f"{err} - in QuoteApi.save", level="ERROR")
+
+    @classmethod
+    def save_soon(cls) -> None:
+        """
+        Saves in the background without waiting. Saves never overlap, and changes made while one
+        is running are written by a single extra pass.
+        """
+
+        cls._dirty = True
+        if cls._saving is None or cls._saving.done():
+            cls._saving = asyncio.create_task(cls._save_pending())
+
+    @classmethod
+    async def _save_pending(cls) -> None:
+        while cls._dirty:
+            cls._dirty = False
+            await cls.save()
+
+    @classmethod
+    async def flush(cls) -> None:
+        # lets shutdown wait for the last save
+        if cls._saving is not None:
+            await cls._saving
+
+    @classmethod
+    def _remember(cls, normalized: str) -> None:
+        if len(cls.history) == cls.history.maxlen:
+            cls._seen.discard(cls.history[0])
+        cls.history.append(normalized)
+        cls._seen.add(normalized)
+
+    @classmethod
+    def add(cls, quote: str) -> bool:
+        """
+        Adds a quote to the pool unless it was seen recently. Returns whether it was added.
+        """
+
+        normalized = QuoteApi.normalize(quote)
+        if not normalized or normalized in cls._seen:
+            return False
+        cls._remember(normalized)
+        cls.quotes.append(quote)
+        return True
+
+    @classmethod
+    async def refill(cls, batch: int) -> int:
+        """
+        Generates up to `batch` quotes, one at a time, stopping once the pool is full.
+        Returns how many were added.
+
+        Parameters
+        ----------
+        batch: `int`
+        """
+
+        if not cls._loaded:
+            cls.load()
+
+        added = 0
+        for _ in range(batch):
+            if len(cls.quotes) >= QUOTE_POOL_SIZE:
+                break
+            data = await PalmApi.extract_async(prompt=QuoteApi.prompt())
+            if data.get('result') and cls.add(data['result']):
+                added += 1
+
+        if added:
+            cls.save_soon()
+        return added
+
+    @classmethod
+    def extract(cls) -> str:
+        if not cls._loaded:
+            cls.load()
+
+        if cls.quotes:
+            return {
+                'result': cls.quotes.popleft(),
+                'source': cls.source
+            }
+        return PalmApi.extract(prompt=QuoteApi.prompt())
+
+    @classmethod
+    async def extract_async(cls) -> str:
+        if not cls._loaded:
+            cls.load()
+
+        if cls.quotes:
+            quote = cls.quotes.popleft()
+            cls.save_soon()
+            return {
+                'result': quote,
+                'source': cls.source
+            }
+
+        # pool ran dry, generate one on the spot
+        data = await PalmApi.extract_async(prompt=QuoteApi.prompt())
+        # a filtered reply has no result, which counts as a failed generation
+        if not data.get('result'):
+            return {}
+        cls._remember(QuoteApi.normalize(data['result']))
+        cls.save_soon()
+        return data
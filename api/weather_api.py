@@ -1,35 +1,159 @@
-from datetime import timedelta
+from api.forecast_cache import ForecastCache
+from api.http_client import HttpClient, UpstreamError
 
-from requests_cache import CachedSession
+from db.cache import TTLCache
 
 from logs.log import log
 
+from config import LOCATION_ALIASES, LOCATION_CACHE_SIZE, LOCATION_CACHE_TTL, LOCATION_NEGATIVE_TTL
+from config import FORECAST_CACHE_FILE, FORECAST_CACHE_SIZE, FORECAST_CACHE_DISK_SIZE, FORECAST_CACHE_MAX_AGE
+
 from secret import WEATHER_KEY, WEATHER_BASE
 
+class LocationResolver:
+    """
+    Canonicalizes user supplied locations and remembers the api's verdict on each: known, or
+    unknown for a shorter while. Forecasts themselves live only in the `ForecastCache`, which
+    knows when they go stale.
+    """
+
+    def __init__(self, aliases: dict[str, str], maxsize: int, ttl: float, negative_ttl: float):
+        self._aliases = {LocationResolver.normalize(alias): name for alias, name in aliases.items()}
+        self._negative_ttl = negative_ttl
+        self._results = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    @staticmethod
+    def normalize(location: str) -> str:
+        return " ".join(location.split()).casefold()
+
+    def canonicalize(self, location: str) -> str:
+        """
+        Returns the form of `location` sent to the api, so that "irvine" and " Irvine " share an entry.
+        """
+
+        key = LocationResolver.normalize(location)
+        return LocationResolver.normalize(self._aliases.get(key, key))
+
+    def get(self, location: str) -> bool:
+        """
+        Returns whether the api recognized `location`, or `None` if it has not been asked recently.
+        """
+
+        return self._results.get(self.canonicalize(location))
+
+    def set(self, location: str, known: bool) -> None:
+        if known:
+            self._results.set(self.canonicalize(location), True)
+        else:
+            self._results.set(self.canonicalize(location), False, ttl=self._negative_ttl)
+
 class WeatherApi:
 
     source = "Open Weather Api"
-
+    resolver = LocationResolver(
+        aliases=LOCATION_ALIASES,
+        maxsize=LOCATION_CACHE_SIZE,
+        ttl=LOCATION_CACHE_TTL,
+        negative_ttl=LOCATION_NEGATIVE_TTL
+    )
+    forecasts = ForecastCache(
+        dbfile=FORECAST_CACHE_FILE,
+        memory_size=FORECAST_CACHE_SIZE,
+        disk_size=FORECAST_CACHE_DISK_SIZE,
+        max_age=FORECAST_CACHE_MAX_AGE
+    )
     @staticmethod
     def request_data(location: str) -> str:
         assert location != ""
 
         try:
-            response = CachedSession("api-cache", expire_after=timedelta(hours=4)).get(url=f"{WEATHER_BASE}/forecast.json?key={WEATHER_KEY}&q={location}&days=1")
+            status, data = HttpClient.get_json_blocking(
+                f"{WEATHER_BASE}/forecast.json",
+                params={'key': WEATHER_KEY, 'q': WeatherApi.resolver.canonicalize(location), 'days': 1}
+            )
+        except Exception as err:
+            log(err, level="ERROR")
+            raise UpstreamError("error retrieiving weather data")
+
+        return WeatherApi.verdict(location, status, data)
+
+    @staticmethod
+    async def request_data_async(location: str) -> dict:
+        assert location != ""
+
+        try:
+            status, data = await HttpClient.get_json(
+                'weather',
+                f"{WEATHER_BASE}/forecast.json",
+                params={'key': WEATHER_KEY, 'q': WeatherApi.resolver.canonicalize(location), 'days': 1}
+            )
         except Exception as err:
-            log(err)
-            raise Exception("error retrieiving weather data")
+            log(err, level="ERROR")
+            raise UpstreamError("error retrieiving weather data")
 
-        if response.status_code == 200:
-            return response.json()
+        return WeatherApi.verdict(location, status, data)
+
+    @staticmethod
+    def verdict(location: str, status: int, data: dict) -> dict:
+        # only the api's verdict on a location is remembered, never an outage
+        # weatherapi answers 400 to several errors, 1006 is "No matching location found."
+        error = data.get('error') if isinstance(data, dict) else None
+        if status == 400 and error and error.get('code') == 1006:
+            WeatherApi.resolver.set(location, False)
+            return None
+        if status != 200 or data is None or error:
+            log(f"weather api replied {status} {error} - in WeatherApi.verdict(location={location})", level="ERROR")
+            raise UpstreamError("error retrieiving weather data")
+
+        WeatherApi.resolver.set(location, True)
+        return data
 
     @classmethod
     def extract(cls, **kwargs) -> {}:
+        location = cls.resolver.canonicalize(kwargs['location'])
+        summary = cls.forecasts.get(location)
+        if summary is not None:
+            return summary
+
         try:
             data = cls.request_data(kwargs['location'])
         except Exception as err:
             return {}
 
+        return cls.remember(location, data)
+
+    @classmethod
+    async def extract_async(cls, **kwargs) -> {}:
+        location = cls.resolver.canonicalize(kwargs['location'])
+        summary = await cls.forecasts.get_async(location)
+        if summary is not None:
+            return summary
+
+        try:
+            data = await cls.request_data_async(kwargs['location'])
+        except Exception as err:
+            return {}
+
+        return cls.remember(location, data)
+
+    @classmethod
+    def remember(cls, location: str, data: dict) -> {}:
+        # summarize a payload and store it in the forecast cache
+        summary = cls.summarize(data)
+        if summary:
+            cls.forecasts.set(
+                location,
+                day=data['forecast']['forecastday'][0]['date'],
+                tz=data['location']['tz_id'],
+                summary=summary
+            )
+        return summary
+
+    @classmethod
+    def summarize(cls, data: dict) -> {}:
+        if not data:
+            return {}
+
         # return relevant data
         path = data['forecast']['forecastday'][0]['day']
         return {
@@ -39,10 +163,29 @@ class WeatherApi:
             'summary': path['condition']['text'],
             'icon': path['condition']['icon'],
             'location': data['location']['name'],
+            'date': data['forecast']['forecastday'][0]['date'],
             'source': cls.source
         }
 
     # helper function
     @staticmethod
     def location_exists(location: str) -> bool:
-        return WeatherApi.request_data(location=location) is not None
\ No newline at end of file
+        known = WeatherApi.resolver.get(location)
+        if known is not None:
+            return known
+
+        data = WeatherApi.request_data(location=location)
+        # the forecast is usually asked for next, so keep it
+        WeatherApi.remember(WeatherApi.resolver.canonicalize(location), data)
+        return data is not None
+
+    @staticmethod
+    async def location_exists_async(location: str) -> bool:
+        known = WeatherApi.resolver.get(location)
+        if known is not None:
+            return known
+
+        # an unreachable api raises `UpstreamError` rather than calling the location unknown
+        data = await WeatherApi.request_data_async(location=location)
+        WeatherApi.remember(WeatherApi.resolver.canonicalize(location), data)
+        return data is not None
@@ -0,0 +1,67 @@
+"""
+Per-operation latency of the user queries, opening a connection per call versus
+borrowing one from a `ConnectionManager`.
+
+Run from the repository root:
+    python -m benchmarks.db_latency [iterations]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from db.database import Database, ConnectionManager
+
+CREATE_USERS = """
+    CREATE TABLE IF NOT EXISTS
+        users (
+            id INTEGER PRIMARY KEY,
+            display_name TEXT NOT NULL,
+            display_avatar TEXT NOT NULL,
+            location TEXT NOT NULL,
+            is_signed_up BIT default 0
+        );
+"""
+OPERATIONS = {
+    'get_user': ("SELECT * FROM users WHERE id = ?", False),
+    'exists_user': ("SELECT 1 FROM users WHERE id = ?", False),
+    'update_location': ("UPDATE users SET location = 'Irvine' WHERE id = ?", True)
+}
+USERS = 1000
+
+def per_call(dbfile: str, sql: str, write: bool, user_id: int) -> None:
+    with Database(dbfile) as db:
+        db.execute(sql, (user_id,))
+        db.fetchall()
+
+def pooled(manager: ConnectionManager, sql: str, write: bool, user_id: int) -> None:
+    with manager.session(write=write) as db:
+        db.execute(sql, (user_id,))
+        db.fetchall()
+
+def measure(fn, target, sql: str, write: bool, iterations: int) -> float:
+    start = time.perf_counter()
+    for i in range(iterations):
+        fn(target, sql, write, i % USERS)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+def main(iterations: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        dbfile = os.path.join(tmp, "bench.sqlite")
+        with Database(dbfile) as db:
+            db.execute(CREATE_USERS)
+            db.cursor.executemany(
+                "INSERT INTO users VALUES(?, ?, ?, ?, ?)",
+                [(i, f"user{i}", "avatar", "Irvine", i % 2) for i in range(USERS)]
+            )
+
+        manager = ConnectionManager(dbfile)
+        print(f"{'operation':<16}{'per-call (us)':>16}{'pooled (us)':>16}{'speedup':>10}")
+        for name, (sql, write) in OPERATIONS.items():
+            before = measure(per_call, dbfile, sql, write, iterations)
+            after = measure(pooled, manager, sql, write, iterations)
+            print(f"{name:<16}{before:>16.1f}{after:>16.1f}{before / after:>9.1f}x")
+        manager.close()
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
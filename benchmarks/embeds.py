@@ -0,0 +1,65 @@
+"""
+Forecast embeds built per second, with recipients spread over a few locations as they are
+for the daily message: building every embed from scratch versus the memoized copies
+`Forecast.generate` hands out. Also times the advice lookup against the old linear scan.
+
+Run from the repository root:
+    python -m benchmarks.embeds [recipients] [locations]
+"""
+import random
+import sys
+import time
+
+from bot.embeds import Forecast
+
+def scan_advice(data: dict) -> str:
+    # the lookup before thresholds were compiled, kept as the baseline
+    advice = ""
+    for category in Forecast.advice:
+        for limit, msg in Forecast.advice[category].items():
+            if data[category] >= int(limit):
+                advice += msg + ' '
+                break
+    return advice
+
+def forecast(location: str) -> dict:
+    return {
+        'location': location,
+        'date': "2024-01-01",
+        'highest_temperature': random.randint(50, 100),
+        'rain': random.randint(0, 100),
+        'wind': random.randint(0, 40),
+        'summary': "Partly cloudy",
+        'icon': "//cdn.weatherapi.com/weather/64x64/day/116.png",
+        'source': "Open Weather Api"
+    }
+
+def timed(label: str, count: int, fn) -> None:
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28}{count / elapsed:>12,.0f} /s{elapsed / count * 1e6:>10.2f} us each")
+
+def main(recipients: int, locations: int) -> None:
+    random.seed(0)
+    forecasts = [forecast(f"Location {i}") for i in range(locations)]
+    # one forecast per recipient, drawn from the shared locations
+    batch = [random.choice(forecasts) for _ in range(recipients)]
+
+    for data in forecasts:
+        assert Forecast.friendly_advice(data) == scan_advice(data)
+    timed("advice, linear scan", recipients, lambda: [scan_advice(data) for data in batch])
+    timed("advice, bisect", recipients, lambda: [Forecast.friendly_advice(data) for data in batch])
+
+    timed("embed, built each time", recipients, lambda: [Forecast.build(data) for data in batch])
+    Forecast.embeds.clear()
+    timed("embed, memoized copies", recipients, lambda: [Forecast.generate(data) for data in batch])
+    assert Forecast.generate(batch[0]).to_dict() == Forecast.embeds.get(
+        (batch[0]['location'], batch[0]['date'], batch[0]['source'])
+    )[1].to_dict()
+
+if __name__ == "__main__":
+    main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 100000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    )
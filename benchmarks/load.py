@@ -0,0 +1,217 @@
+"""
+End to end load test of the bot's slash commands and daily message. The real handlers in
+`bot.bot` run against fake Discord interactions and DM channels, and a Manager built on a
+temporary database with stub apis that sleep for a typical upstream latency. Nothing leaves
+the process.
+
+`users` users each run one command to get stored, then `commands` commands drawn from a
+typical mix run with `concurrency` in flight. Finally every user signs up and one daily
+message batch is sent to all of them. Reports p50/p95/p99 latency, throughput and memory.
+
+Run from the repository root:
+    python -m benchmarks.load [users] [commands] [concurrency] [--unthrottled]
+
+--unthrottled lifts DAILY_RATE for the daily message, measuring the bot instead of the limit.
+"""
+import asyncio
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+import bot.bot as module
+
+from bot.daily import DailyDigest
+from bot.delivery import DeliveryEngine, DeliveryReport
+from bot.manager import Manager
+
+from config import DAILY_CONCURRENCY, DAILY_RATE
+
+# seconds each fake upstream takes, drawn uniformly from the range
+WEATHER_LATENCY = (0.05, 0.15)
+CAT_LATENCY = (0.02, 0.06)
+TEXT_LATENCY = (0.5, 1.5)
+# discord's reply to sending a message or DM
+DISCORD_LATENCY = (0.03, 0.08)
+
+LOCATIONS = ["Irvine", "London", "Tokyo", "Paris", "New York", "Sydney", "Toronto", "Berlin"]
+
+async def pause(latency: tuple[float, float]) -> None:
+    await asyncio.sleep(random.uniform(*latency))
+
+class FakeWeatherApi:
+
+    source = "Fake Weather"
+
+    @classmethod
+    async def extract_async(cls, location: str) -> dict:
+        await pause(WEATHER_LATENCY)
+        return {
+            'location': location,
+            'highest_temperature': random.randint(50, 100),
+            'rain': random.randint(0, 100),
+            'wind': random.randint(0, 40),
+            'summary': "Partly cloudy",
+            'icon': "//cdn.weatherapi.com/weather/64x64/day/116.png",
+            'source': cls.source
+        }
+
+    @classmethod
+    async def location_exists_async(cls, location: str) -> bool:
+        await pause(WEATHER_LATENCY)
+        return location in LOCATIONS
+
+class FakeCatApi:
+
+    @classmethod
+    async def extract_async(cls) -> dict:
+        await pause(CAT_LATENCY)
+        return {'url': f"https://cdn2.thecatapi.com/images/{random.randint(0, 9999)}.jpg", 'source': "Fake Cats"}
+
+class FakeQuoteApi:
+
+    @classmethod
+    async def extract_async(cls) -> dict:
+        # served from the pre-generated pool, no upstream call
+        return {'result': "Fake it till you make it.", 'source': "Fake Quotes"}
+
+class FakeTextApi:
+
+    @classmethod
+    async def extract_async(cls, prompt: str) -> dict:
+        await pause(TEXT_LATENCY)
+        return {'result': "Beep boop.", 'source': "Fake Text"}
+
+class FakeAvatar:
+
+    def __init__(self, url: str):
+        self.url = url
+
+class FakeUser:
+
+    def __init__(self, user_id: int):
+        self.id = user_id
+        self.display_name = f"user{user_id}"
+        self.display_avatar = FakeAvatar(f"https://cdn.discordapp.com/embed/avatars/{user_id % 6}.png")
+
+class FakeResponse:
+
+    async def send_message(self, *args, **kwargs) -> None:
+        await pause(DISCORD_LATENCY)
+
+class FakeInteraction:
+
+    def __init__(self, user: FakeUser, command):
+        self.user = user
+        self.command = command
+        self.extras = {}
+        self.response = FakeResponse()
+
+class FakeChannel:
+
+    async def send(self, *args, **kwargs) -> None:
+        await pause(DISCORD_LATENCY)
+
+# command, arguments and weight in the mix
+MIX = [
+    (module.forecast, lambda: {}, 30),
+    (module.forecast, lambda: {'location': random.choice(LOCATIONS)}, 15),
+    (module.view_reminders, lambda: {'confirmation': True}, 15),
+    (module.add_reminders, lambda: {'reminder1': "water the plants", 'reminder2': "call mom"}, 15),
+    (module.remove_reminders, lambda: {'index': 1}, 5),
+    (module.motivation, lambda: {'confirmation': True}, 10),
+    (module.help_commands, lambda: {'confirmation': True}, 5),
+    (module.set_delivery_time, lambda: {'delivery_time': "07:30"}, 5)
+]
+
+async def run_command(user_id: int, command, kwargs: dict) -> None:
+    interaction = FakeInteraction(FakeUser(user_id), command)
+    await module.bot.tree.interaction_check(interaction)
+    await command.callback(interaction, **kwargs)
+
+def percentiles(latencies: list[float]) -> str:
+    report = DeliveryReport(latencies=dict(enumerate(latencies)))
+    return f"p50 {report.percentile(50) * 1000:.1f}ms  p95 {report.percentile(95) * 1000:.1f}ms  p99 {report.percentile(99) * 1000:.1f}ms"
+
+def peak_rss_mb() -> float:
+    # kilobytes on linux, bytes on macos
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+async def run(users: int, commands: int, concurrency: int, unthrottled: bool) -> None:
+    # stored users and the in-flight user commands
+    user_ids = list(range(10 ** 17, 10 ** 17 + users))
+    for user_id in user_ids:
+        await run_command(user_id, module.forecast, {})
+    print(f"stored {users} users, peak rss {peak_rss_mb():.1f}MB")
+
+    latencies: dict[str, list[float]] = {}
+    semaphore = asyncio.Semaphore(concurrency)
+    weights = [weight for _, _, weight in MIX]
+
+    async def one() -> None:
+        command, arguments, _ = random.choices(MIX, weights=weights)[0]
+        async with semaphore:
+            start = time.perf_counter()
+            await run_command(random.choice(user_ids), command, arguments())
+            latencies.setdefault(command.name, []).append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one() for _ in range(commands)])
+    elapsed = time.perf_counter() - start
+
+    print(f"\n{commands} commands, {concurrency} in flight: {elapsed:.2f}s, {commands / elapsed:.1f} commands/s")
+    print(f"  {'all':<18}{percentiles([latency for values in latencies.values() for latency in values])}")
+    for name, values in sorted(latencies.items()):
+        print(f"  {name:<18}{percentiles(values)}  ({len(values)} runs)")
+
+    # every user gets the daily message in one batch
+    for user_id in user_ids:
+        await run_command(user_id, module.signup, {'confirmation': True})
+    module.bot.get_user = lambda user_id: FakeChannel()
+    if unthrottled:
+        module.delivery = DeliveryEngine(concurrency=DAILY_CONCURRENCY, rate=float('inf'))
+
+    start = time.perf_counter()
+    await module.send_daily_msgs(user_ids)
+    elapsed = time.perf_counter() - start
+    daily = module.manager.metrics.snapshot()[('task', 'daily_msg_recipient')]
+
+    rate = "unthrottled" if unthrottled else f"DAILY_RATE {DAILY_RATE}/s"
+    print(f"\ndaily message to {users} users ({DAILY_CONCURRENCY} in flight, {rate}): {elapsed:.2f}s, {users / elapsed:.1f} messages/s")
+    print(f"  per recipient p50 {daily['p50'] * 1000:.1f}ms  p95 {daily['p95'] * 1000:.1f}ms  p99 {daily['p99'] * 1000:.1f}ms")
+
+    print("\ndatabase, including the wait for a worker thread")
+    for (kind, name), stat in module.manager.metrics.snapshot().items():
+        if kind == 'db':
+            print(f"  {name:<26}p50 {stat['p50'] * 1000:.2f}ms  p99 {stat['p99'] * 1000:.2f}ms  ({stat['count']} calls)")
+
+    print(f"\npeak rss {peak_rss_mb():.1f}MB")
+
+def main(users: int, commands: int, concurrency: int, unthrottled: bool) -> None:
+    random.seed(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        module.manager = Manager(
+            apis={
+                'weather': FakeWeatherApi,
+                'text': FakeTextApi,
+                'quote': FakeQuoteApi,
+                'cat': FakeCatApi
+            },
+            embeds=module.manager._embeds,
+            dbfile=os.path.join(tmp, "load.sqlite")
+        )
+        module.digest = DailyDigest(module.manager)
+        asyncio.run(run(users, commands, concurrency, unthrottled))
+        module.manager.close()
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != "--unthrottled"]
+    main(
+        int(args[0]) if len(args) > 0 else 1000,
+        int(args[1]) if len(args) > 1 else 5000,
+        int(args[2]) if len(args) > 2 else 100,
+        "--unthrottled" in sys.argv
+    )
@@ -0,0 +1,55 @@
+"""
+Stress test of reminder storage: thousands of reminders per user, added from several threads
+at once and removed from the front of the list.
+
+Run from the repository root:
+    python -m benchmarks.reminders_stress [reminders per user]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from bot.manager import Manager
+from bot.user import User
+
+THREADS = 8
+
+def timed(label: str, count: int, fn) -> None:
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<36}{elapsed:>8.2f}s{elapsed / count * 1e6:>12.1f} us/op")
+
+def main(count: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = Manager(apis={}, embeds={}, dbfile=os.path.join(tmp, "bench.sqlite"))
+        for user_id in (1, 2):
+            manager.add_user(User(id=user_id, display_name=f"user{user_id}", display_avatar="avatar"))
+
+        timed("add (sequential)", count, lambda: [
+            manager.add_reminder(1, f"reminder {i}") for i in range(count)
+        ])
+
+        with ThreadPoolExecutor(max_workers=THREADS) as pool:
+            timed(f"add ({THREADS} threads)", count, lambda: list(pool.map(
+                lambda i: manager.add_reminder(2, f"reminder {i}"), range(count)
+            )))
+        with manager._db.session() as db:
+            db.execute("SELECT COUNT(*), COUNT(DISTINCT r_index) FROM reminders WHERE owner_id = 2")
+            rows, indexes = db.fetchone()
+        print(f"  concurrent adds stored {rows}/{count} rows with {indexes} distinct indexes")
+
+        timed("get_reminders", 100, lambda: [manager.get_reminders(1) for _ in range(100)])
+        timed("remove (front)", count // 2, lambda: [manager.remove_reminder(1, 0) for _ in range(count // 2)])
+        timed("remove (back)", count // 4, lambda: [
+            manager.remove_reminder(1, count // 2 - i - 1) for i in range(count // 4)
+        ])
+        assert manager.get_reminders(1) == [f"reminder {i}" for i in range(count // 2, count - count // 4)]
+
+        manager.close()
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
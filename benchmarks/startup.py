@@ -0,0 +1,87 @@
+"""
+Cold start cost of the bot, measured in fresh interpreters for both values of `LAZY_STARTUP`:
+how long `import bot.bot` (what `main.py` runs before connecting) takes, whether it touches the
+network, the peak resident memory, and with --connect the time until `on_ready`. With
+`LAZY_STARTUP = False` the database and the text api, with its google client import, load
+during the import as they did before startup was deferred.
+
+Run from the repository root:
+    python -m benchmarks.startup [runs] [--connect]
+"""
+import json
+import statistics
+import subprocess
+import sys
+
+CHILD = """
+import json
+import resource
+import sys
+import time
+
+LAZY, CONNECT = {lazy}, {connect}
+network = []
+result = {{}}
+
+def audit(event, args):
+    if event == "socket.getaddrinfo":
+        network.append(f"lookup {{args[0]}}:{{args[1]}}")
+    elif event == "socket.connect":
+        network.append(f"connect {{args[1]}}")
+
+start = time.perf_counter()
+sys.addaudithook(audit)
+
+import config
+config.LAZY_STARTUP = LAZY
+import bot.bot as module
+result['import_seconds'] = time.perf_counter() - start
+result['network'] = list(network)
+
+if CONNECT:
+    from secret import DISCORD_TOKEN
+
+    async def ready():
+        result['ready_seconds'] = time.perf_counter() - start
+        await module.bot.close()
+
+    module.bot.add_listener(ready, 'on_ready')
+    module.bot.run(DISCORD_TOKEN, log_handler=None)
+
+# kilobytes on linux, bytes on macos
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+result['peak_rss_mb'] = peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+print(json.dumps(result))
+"""
+
+def run_once(lazy: bool, connect: bool) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD.format(lazy=lazy, connect=connect)],
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+    return json.loads(result.stdout.splitlines()[-1])
+
+def describe(values: list[float], unit: str) -> str:
+    return f"median {statistics.median(values):.3f}{unit} (min {min(values):.3f}{unit}, max {max(values):.3f}{unit})"
+
+def main(runs: int, connect: bool) -> None:
+    for lazy in (False, True):
+        results = [run_once(lazy, connect) for _ in range(runs)]
+
+        print(f"LAZY_STARTUP = {lazy}, {runs} runs")
+        print(f"  import bot.bot  {describe([result['import_seconds'] for result in results], 's')}")
+        if connect:
+            print(f"  on_ready        {describe([result['ready_seconds'] for result in results], 's')}")
+        print(f"  peak rss        {describe([result['peak_rss_mb'] for result in results], 'MB')}")
+
+        network = results[0]['network']
+        print(f"  network calls during import: {len(network)}")
+        for call in network:
+            print(f"    {call}")
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != "--connect"]
+    main(int(args[0]) if args else 5, "--connect" in sys.argv)
@@ -0,0 +1,55 @@
+import discord
+
+import io
+import os
+import threading
+
+ATTACHMENT = "attachment://"
+
+class AssetStore:
+    """
+    Every file in `directory`, read into memory once. Each send still needs its own
+    `discord.File`, so `file` wraps the cached bytes in a fresh buffer instead of opening the
+    file again.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._files: dict[str, bytes] = None
+        self._lock = threading.Lock()
+
+    def load(self) -> None:
+        if self._files is not None:
+            return None
+        with self._lock:
+            if self._files is None:
+                files = {}
+                for name in os.listdir(self.directory):
+                    path = os.path.join(self.directory, name)
+                    if os.path.isfile(path):
+                        with open(path, "rb") as asset:
+                            files[name] = asset.read()
+                self._files = files
+
+    def read(self, name: str) -> bytes:
+        self.load()
+        return self._files[name]
+
+    def file(self, name: str) -> discord.File:
+        """
+        Returns an attachment of the asset `name`, referenced in embeds as attachment://`name`.
+        """
+
+        return discord.File(io.BytesIO(self.read(name)), filename=name)
+
+    def attachments(self, embeds: list[discord.Embed]) -> list[discord.File]:
+        """
+        Returns the assets that `embeds` reference as attachments, such as the cat api's fallback image.
+        """
+
+        names = set()
+        for embed in embeds:
+            for url in (embed.image.url, embed.thumbnail.url):
+                if url and url.startswith(ATTACHMENT):
+                    names.add(url.removeprefix(ATTACHMENT))
+        return [self.file(name) for name in sorted(names)]
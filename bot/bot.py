@@ -1,40 +1,84 @@
 import discord
 from discord.ext import commands, tasks
 
+import asyncio
 import datetime
+import time
+
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 from api.weather_api import WeatherApi
 from api.palm_api import PalmApi
 from api.cat_api import CatApi
+from api.quote_api import QuoteApi
+from api.http_client import HttpClient, UpstreamError
 
-from bot.embeds import Reminders, Forecast, Motivation, DailyCat
+from bot.embeds import Reminders, Forecast, Motivation, DailyCat, Help
 from bot.manager import Manager
+from bot.delivery import DeliveryEngine
+from bot.daily import DailyDigest
+from bot.scheduler import DeliveryScheduler
+from bot.assets import AssetStore
 
 from bot.user import User
-from bot.commands import COMMANDS
 
 from logs.log import log
 
 from config import *
 
 
+class MrWeatherTree(discord.app_commands.CommandTree):
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        interaction.extras['started'] = time.perf_counter()
+        # runs before every slash command, so handlers can rely on the user being stored
+        interaction.extras['user'] = await manager.ensure_user_async(User(
+            id=interaction.user.id,
+            display_name=interaction.user.display_name,
+            display_avatar=interaction.user.display_avatar.url
+        ))
+        return True
+
+    async def on_error(self, interaction: discord.Interaction, error: discord.app_commands.AppCommandError) -> None:
+        if 'started' in interaction.extras:
+            name = interaction.command.qualified_name if interaction.command else "unknown"
+            manager.metrics.observe('command', name, time.perf_counter() - interaction.extras['started'], error=True)
+        await super().on_error(interaction, error)
+
+class MrWeather(commands.Bot):
+
+    async def close(self) -> None:
+        # release pooled api connections and finish writing the quote pool on shutdown
+        await HttpClient.close()
+        await QuoteApi.flush()
+        await super().close()
+
 intents = discord.Intents.default()
 # for rights to send DMs
 intents.message_content = True
-bot = commands.Bot(command_prefix=COMMAND_PREFIX, intents=intents)
+bot = MrWeather(command_prefix=COMMAND_PREFIX, intents=intents, tree_cls=MrWeatherTree)
 manager = Manager(
     apis={
         'weather': WeatherApi,
         'text': PalmApi,
+        'quote': QuoteApi,
         'cat': CatApi
     },
     embeds={
         'reminders': Reminders,
         'forecast':  Forecast,
         'motivation': Motivation,
-        'cat': DailyCat
-    }
+        'cat': DailyCat,
+        'help': Help
+    },
+    lazy=LAZY_STARTUP
 )
+delivery = DeliveryEngine(concurrency=DAILY_CONCURRENCY, rate=DAILY_RATE)
+digest = DailyDigest(manager)
+assets = AssetStore(ASSETS_DIR)
+if not LAZY_STARTUP:
+    # load the text api at import, as on_ready would otherwise do once connected
+    PalmApi.client()
 
 @bot.event
 async def on_ready():
@@ -43,37 +87,90 @@ async def on_ready():
     if bot.is_ws_ratelimited:
         log("Uh oh, bot is being rate-limited.")
 
-    daily_msg.start()
+    # on_ready fires again after reconnects
+    if not deliveries.is_running:
+        if LAZY_STARTUP:
+            # finish what was skipped at import now that the gateway is up
+            await manager.setup_async()
+            try:
+                await asyncio.to_thread(PalmApi.client)
+            except Exception as err:
+                # the text api loads again on first use, the rest of the bot still starts
+                log(f"{err} - in on_ready loading the text api", level="ERROR")
+        await asyncio.to_thread(assets.load)
+        for user in await manager.get_signed_up_users_async():
+            schedule(user)
+        warmups.start()
+        deliveries.start()
+        prepare_daily_msg.start()
+        refill_quotes.start()
+        snapshot_metrics.start()
     await bot.tree.sync()
 
-@tasks.loop(time=TIME)
-async def daily_msg():
-    channels = [await bot.fetch_user(user_id) for user_id in manager.get_signed_up()]
-    for channel in channels:
-        await channel.send(
-            embeds=[
-                manager.embed(
-                    name='cat',
-                    data=manager.api_call(name='cat')
-                ),
-                manager.embed(
-                    name='reminders',
-                    user=manager.get_user(user_id=channel.id),
-                    reminders=manager.get_reminders(user_id=channel.id)
-                ),
-                manager.embed(
-                    name='forecast',
-                    data=manager.api_call(name='weather', location=manager.get_user(channel.id).location)
-                ),
-                manager.embed(
-                    name='motivation',
-                    data=manager.api_call(
-                        name='text',
-                        prompt=MOTIVATION_PROMPT
-                    ),
-                )
-            ]
-        )
+def schedule(user: User) -> None:
+    delivery_time = datetime.time.fromisoformat(user.delivery_time) if user.delivery_time else None
+    warmups.schedule(user.id, delivery_time, user.timezone)
+    deliveries.schedule(user.id, delivery_time, user.timezone)
+
+def unschedule(user_id: int) -> None:
+    warmups.cancel(user_id)
+    deliveries.cancel(user_id)
+
+async def warm_daily_msgs(user_ids: list[int]) -> None:
+    start = time.perf_counter()
+    users = await asyncio.gather(*[manager.get_user_async(user_id) for user_id in user_ids])
+    locations = list({user.location for user in users})
+    await digest.warm(locations, concurrency=WARMUP_CONCURRENCY)
+    log(f"warm_daily_msgs fetched {len(locations)} locations for {len(users)} users in {time.perf_counter() - start:.2f}s")
+
+@tasks.loop(minutes=QUOTE_REFILL_MINUTES)
+async def refill_quotes():
+    # leave the text api to users while they are talking to the bot
+    if not PalmApi.is_busy():
+        await QuoteApi.refill(batch=QUOTE_REFILL_BATCH)
+
+@tasks.loop(time=PREPARE_TIME)
+async def prepare_daily_msg():
+    # the default TIME is the biggest batch of the day
+    # an earlier custom time batch may have made today's motivation already, which is kept
+    await digest.prepare(list(await manager.get_signed_up_locations_async()))
+
+async def send_daily_msgs(user_ids: list[int]) -> None:
+    users = await asyncio.gather(*[manager.get_user_async(user_id) for user_id in user_ids])
+    # users share a few locations, so each forecast is built once per batch
+    locations = {user.location for user in users}
+    if not digest.is_prepared:
+        await digest.prepare(list(locations))
+
+    recipients = {user.id: user for user in users}
+
+    async def deliver(user_id: int) -> None:
+        channel = bot.get_user(user_id) or await bot.fetch_user(user_id)
+        embeds = await digest.message(recipients[user_id])
+        # the cat embed points at the bot icon when the cat api is down
+        await channel.send(embeds=embeds, files=assets.attachments(embeds))
+
+    report = await delivery.run(list(recipients), deliver)
+    digest.clear_forecasts()
+    manager.metrics.observe('task', 'daily_msg', report.elapsed, error=bool(report.failed))
+    for recipient, seconds in report.latencies.items():
+        manager.metrics.observe('task', 'daily_msg_recipient', seconds, error=recipient in report.failed)
+    log(f"daily_msg {report.summary()} across {len(locations)} locations")
+
+@tasks.loop(minutes=METRICS_SNAPSHOT_MINUTES)
+async def snapshot_metrics():
+    try:
+        await asyncio.to_thread(manager.metrics.write, METRICS_FILE)
+    except OSError as err:
+        log(f"{err} - in snapshot_metrics", level="ERROR")
+
+@bot.event
+async def on_app_command_completion(interaction: discord.Interaction, command: discord.app_commands.Command) -> None:
+    if 'started' in interaction.extras:
+        manager.metrics.observe('command', command.qualified_name, time.perf_counter() - interaction.extras['started'])
+
+warmups = DeliveryScheduler(warm_daily_msgs, offset=WARMUP_OFFSET)
+deliveries = DeliveryScheduler(send_daily_msgs)
 
 @bot.tree.command(name="forecast")
 async def forecast(
@@ -83,27 +180,28 @@ async def forecast(
 ) -> None:
     """Get today's forecast for any location."""
 
-    if not manager.exists_user(interaction.user.id):
-        manager.add_user(User(
-            id=interaction.user.id,
-            display_name=interaction.user.display_name,
-            display_avatar=interaction.user.display_avatar.url
-        ))
-
     if location == "":
         await interaction.response.send_message(
             embed=manager.embed(
                 name='forecast',
-                data=manager.api_call(name='weather', location=manager.get_user(interaction.user.id).location)
+                data=await manager.api_call_async(name='weather', location=interaction.extras['user'].location)
             )
          )
-    elif location != "" and manager.location_exists('weather', location):
+        return None
+
+    try:
+        exists = await manager.location_exists_async('weather', location)
+    except UpstreamError:
+        await interaction.response.send_message("Error: the weather service is unavailable, try again later.", ephemeral=True)
+        return None
+
+    if exists:
         if set_default:
-            manager.update_location(interaction.user.id, location)
+            await manager.update_location_async(interaction.user.id, location)
         await interaction.response.send_message(
             embed=manager.embed(
                 name='forecast',
-                data=manager.api_call(name='weather', location=location)
+                data=await manager.api_call_async(name='weather', location=location)
             )
          )
     else:
@@ -118,18 +216,9 @@ async def signup(
     if not confirmation:
         await interaction.response.send_message("Info: request canceled.", ephemeral=True)
         return None
-    # add user info and restart the task loop
-    if not manager.exists_user(interaction.user.id):
-        manager.add_user(User(
-            id=interaction.user.id,
-            display_name=interaction.user.display_name,
-            display_avatar=interaction.user.display_avatar.url,
-            is_signed_up=True
-        ))
-        await interaction.response.send_message("Success: signed up!", ephemeral=True)
-    else:
-        manager.update_signup(interaction.user.id, True)
-        await interaction.response.send_message("Success: signed up!", ephemeral=True)
+    await manager.update_signup_async(interaction.user.id, True)
+    schedule(await manager.get_user_async(interaction.user.id))
+    await interaction.response.send_message("Success: signed up!", ephemeral=True)
 
 @bot.tree.command(name="opt-out")
 async def optout(
@@ -141,15 +230,34 @@ async def optout(
         await interaction.response.send_message("Info: request canceled.", ephemeral=True)
         return None
 
-    if not manager.exists_user(interaction.user.id):
-        manager.add_user(User(
-            id=interaction.user.id,
-            display_name=interaction.user.display_name,
-            display_avatar=interaction.user.display_avatar.url
-        ))
-    manager.update_signup(interaction.user.id, False)
+    await manager.update_signup_async(interaction.user.id, False)
+    unschedule(interaction.user.id)
     await interaction.response.send_message("Success: opted out!", ephemeral=True)
 
+@bot.tree.command(name="delivery-time")
+@discord.app_commands.describe(
+    delivery_time="Local time of your daily message, as HH:MM",
+    timezone="Your timezone, e.g. America/Los_Angeles"
+)
+async def set_delivery_time(
+    interaction: discord.Interaction,
+    delivery_time: str,
+    timezone: str=DEFAULT_TIMEZONE
+) -> None:
+    """Choose when your daily message arrives."""
+    try:
+        delivery_time = datetime.time.fromisoformat(delivery_time).strftime("%H:%M")
+        ZoneInfo(timezone)
+    except (ValueError, ZoneInfoNotFoundError):
+        await interaction.response.send_message(f"Error: {delivery_time} {timezone} was not recognized.", ephemeral=True)
+        return None
+
+    await manager.update_delivery_time_async(interaction.user.id, delivery_time, timezone)
+    user = await manager.get_user_async(interaction.user.id)
+    if user.is_signed_up:
+        schedule(user)
+    await interaction.response.send_message(f"Success: daily messages will arrive at {delivery_time} ({timezone})!", ephemeral=True)
+
 '''
 Reminder Details
 Unique for each user
@@ -167,19 +275,25 @@ async def add_reminders(
     reminder3: str=""
 ) -> None:
     """Add a reminder."""
-    if not manager.exists_user(interaction.user.id):
-        manager.add_user(User(
-            id=interaction.user.id,
-            display_name=interaction.user.display_name,
-            display_avatar=interaction.user.display_avatar.url
-        ))
-
-    reminders = [reminder1, reminder2, reminder3]
-    for reminder in reminders:
-        manager.add_reminder(interaction.user.id, reminder)
+    await manager.add_reminders_async(interaction.user.id, [reminder1, reminder2, reminder3])
 
     await interaction.response.send_message("Success: added reminders!", ephemeral=True)
 
+@bot.tree.command(name="import-reminders")
+@discord.app_commands.describe(
+    reminders="Your reminders, separated by new lines or semicolons"
+)
+async def import_reminders(
+    interaction: discord.Interaction,
+    reminders: str
+) -> None:
+    """Add many reminders at once."""
+    reminders = [reminder.strip() for reminder in reminders.replace(';', '\n').splitlines()]
+    reminders = [reminder for reminder in reminders if reminder != ""]
+    await manager.add_reminders_async(interaction.user.id, reminders)
+
+    await interaction.response.send_message(f"Success: added {len(reminders)} reminders!", ephemeral=True)
+
 @bot.tree.command(name="view-reminders")
 async def view_reminders(
     interaction: discord.Interaction,
@@ -190,18 +304,11 @@ async def view_reminders(
         await interaction.response.send_message("Info: request canceled.", ephemeral=True)
         return None
 
-    if not manager.exists_user(interaction.user.id):
-        manager.add_user(User(
-            id=interaction.user.id,
-            display_name=interaction.user.display_name,
-            display_avatar=interaction.user.display_avatar.url
-        ))
-
     await interaction.response.send_message(
         embed=manager.embed(
             name='reminders',
-            user=manager.get_user(interaction.user.id),
-            reminders=manager.get_reminders(interaction.user.id)
+            user=interaction.extras['user'],
+            reminders=await manager.get_reminders_async(interaction.user.id)
         )
     )
 
@@ -214,17 +321,8 @@ async def remove_reminders(
     index: int
 ) -> None:
     """Remove one of your reminders."""
-    if not manager.exists_user(interaction.user.id):
-        manager.add_user(User(
-            id=interaction.user.id,
-            display_name=interaction.user.display_name,
-            display_avatar=interaction.user.display_avatar.url
-        ))
-        await interaction.response.send_message("Error: you have no reminders.")
-        return None
-
     try:
-        manager.remove_reminder(interaction.user.id, index-1)
+        await manager.remove_reminder_async(interaction.user.id, index-1)
     except IndexError:
         # user entered invalid index
         await interaction.response.send_message("Error: invalid index.", ephemeral=True)
@@ -245,10 +343,7 @@ async def motivation(
     await interaction.response.send_message(
         embed=manager.embed(
             name='motivation',
-            data=manager.api_call(
-                name='text',
-                prompt=MOTIVATION_PROMPT
-            ),
+            data=await manager.api_call_async(name='quote'),
         )
     )
 
@@ -262,20 +357,35 @@ async def help_commands(
         await interaction.response.send_message("Info: request canceled.", ephemeral=True)
         return None
 
+    await interaction.response.send_message(embed=manager.embed(name='help'), file=assets.file(BOT_ICON))
+
+@bot.tree.command(name="stats")
+@discord.app_commands.default_permissions(administrator=True)
+async def stats(interaction: discord.Interaction) -> None:
+    """View latency of commands, api calls and database methods."""
+    if interaction.user.id not in ADMIN_IDS and not await bot.is_owner(interaction.user):
+        await interaction.response.send_message("Error: only admins may view stats.", ephemeral=True)
+        return None
+
     embed = discord.Embed(
-        title="Mr. Weather Commands",
+        title="Mr. Weather Stats",
         color=discord.Color.random(),
         timestamp=datetime.datetime.now()
     )
-    icon = discord.File("assets/bot_icon.jpg", filename="bot_icon.jpg")
-    embed.set_image(url="attachment://bot_icon.jpg")
-    # table headers
-
-    for command in COMMANDS:
-        embed.add_field(name="", value=f"**{command['name']}**", inline=False)
-        embed.add_field(name="", value=command['description'], inline=False)
+    rows = {}
+    for (kind, name), stat in manager.metrics.snapshot().items():
+        rows.setdefault(kind, []).append(
+            f"{name:<22} {stat['count']:>6} {stat['errors']:>4} {stat['p50'] * 1000:>7.1f} {stat['p95'] * 1000:>7.1f} {stat['p99'] * 1000:>7.1f}"
+        )
+    header = f"{'name':<22} {'calls':>6} {'errs':>4} {'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7}"
+    for kind, lines in rows.items():
+        # embed field values are capped at 1024 characters
+        value = "\n".join([header, *lines])[:1016]
+        embed.add_field(name=kind, value=f"```\n{value}\n```", inline=False)
+    if not rows:
+        embed.description = "Nothing recorded yet."
 
-    await interaction.response.send_message(embed=embed, file=icon)
+    await interaction.response.send_message(embed=embed, ephemeral=True)
 
 @bot.event
 async def on_message(message: str):
@@ -283,11 +393,12 @@ async def on_message(message: str):
         return
 
     if bot.user.mentioned_in(message):
-        data = manager.api_call(
+        data = await manager.api_call_async(
             name='text',
             prompt=f"{PERSONALITY} {message.content}"
         )
         if not data:
             await message.channel.send("Error.")
+            return None
 
         await message.channel.send(data['result'])
\ No newline at end of file
@@ -7,6 +7,10 @@ COMMANDS = [
         'name': "/opt-out",
         'description': "Opt out of receiving daily previews."
     },
+    {
+        'name': "/delivery-time",
+        'description': "Choose the local time and timezone of your daily preview."
+    },
     {
         'name': "/forecast",
         'description': "View today's forecast of any location."
@@ -15,6 +19,10 @@ COMMANDS = [
         'name': "/add-reminder",
         'description': "Add any reminders you want. Reminders can be viewed by using /view-reminders"
     },
+    {
+        'name': "/import-reminders",
+        'description': "Add many reminders at once, separated by new lines or semicolons."
+    },
     {
         'name': "/remove-reminder",
         'description': "Remove any reminder."
@@ -0,0 +1,125 @@
+import discord
+
+import asyncio
+import datetime
+
+from bot.manager import Manager
+from bot.user import User
+
+from config import TIME
+
+class DailyDigest:
+    """
+    Content for the daily message. Everything shared between recipients is generated by
+    `prepare` and reused, leaving only the reminders and a cat from the api's pool to pick per
+    user. The motivation is generated once a day, so every batch that day shares it.
+    """
+
+    def __init__(self, manager: Manager):
+        self._manager = manager
+        # day of the current motivation, set only once one was generated
+        self._day = None
+        # held while generating the motivation so overlapping batches share one quote
+        self._motivation_lock = asyncio.Lock()
+
+        self.motivation: discord.Embed = None
+        # forecast embed of each location
+        self.forecasts: dict[str, discord.Embed] = {}
+
+    @staticmethod
+    def today() -> datetime.date:
+        return datetime.datetime.now(TIME.tzinfo).date()
+
+    @property
+    def is_prepared(self) -> bool:
+        return self._day == DailyDigest.today()
+
+    async def warm(self, locations: list[str], concurrency: int) -> None:
+        """
+        Fetches the forecast of every location ahead of time so the weather api caches them,
+        leaving `prepare` and the send itself without weather requests.
+
+        Parameters
+        ----------
+        locations: `list[str]`
+        concurrency: `int`
+            Most forecasts fetched at once.
+        """
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch(location: str) -> None:
+            async with semaphore:
+                await self._manager.api_call_async(name='weather', location=location)
+
+        await asyncio.gather(*[fetch(location) for location in locations])
+
+    async def prepare(self, locations: list[str]) -> None:
+        """
+        Generates the forecast embed of every location, and the shared motivation embed if
+        today's has not been made yet.
+
+        Parameters
+        ----------
+        locations: `list[str]`
+            Locations of the users who will receive the message.
+        """
+
+        forecasts, _ = await asyncio.gather(
+            asyncio.gather(*[self._manager.api_call_async(name='weather', location=location) for location in locations]),
+            self.prepare_motivation()
+        )
+
+        self.forecasts.update({
+            location: self._manager.embed(name='forecast', data=data) for location, data in zip(locations, forecasts)
+        })
+
+    async def prepare_motivation(self) -> None:
+        async with self._motivation_lock:
+            today = DailyDigest.today()
+            if self._day == today:
+                return None
+
+            data = await self._manager.api_call_async(name='quote')
+            self.motivation = self._manager.embed(name='motivation', data=data)
+            # a failed quote goes out as the error embed this once, and the next batch retries
+            if data:
+                self._day = today
+
+    def clear(self) -> None:
+        self._day = None
+        self.motivation = None
+        self.forecasts = {}
+
+    def clear_forecasts(self) -> None:
+        # forecasts change through the day, unlike the quote
+        self.forecasts = {}
+
+    async def forecast(self, location: str) -> discord.Embed:
+        # users who moved or signed up after `prepare` ran
+        if location not in self.forecasts:
+            self.forecasts[location] = self._manager.embed(
+                name='forecast',
+                data=await self._manager.api_call_async(name='weather', location=location)
+            )
+        return self.forecasts[location]
+
+    async def message(self, user: User) -> list[discord.Embed]:
+        """
+        Returns the embeds of one user's daily message. Call `prepare` first.
+
+        Parameters
+        ----------
+        user: `User`
+        """
+
+        return [
+            self._manager.embed(name='cat', data=await self._manager.api_call_async(name='cat')),
+            self._manager.embed(
+                name='reminders',
+                user=user,
+                reminders=await self._manager.get_reminders_async(user.id)
+            ),
+            await self.forecast(user.location),
+            self.motivation
+        ]
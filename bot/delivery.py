@@ -0,0 +1,86 @@
+import asyncio
+import time
+
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+from logs.log import log
+
+class RateLimiter:
+    """
+    Spaces out callers so that at most `rate` of them start per second.
+    """
+
+    def __init__(self, rate: float):
+        self._interval = 1 / rate
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next - now
+            self._next = max(now, self._next) + self._interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+@dataclass
+class DeliveryReport:
+    elapsed: float = 0.0
+    # seconds each recipient took, keyed by recipient
+    latencies: dict = field(default_factory=dict)
+    failed: set = field(default_factory=set)
+
+    def percentile(self, p: float) -> float:
+        ordered = sorted(self.latencies.values())
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+    def summary(self) -> str:
+        return (
+            f"delivered {len(self.latencies) - len(self.failed)}/{len(self.latencies)} in {self.elapsed:.2f}s"
+            f" | per recipient p50={self.percentile(50):.2f}s p95={self.percentile(95):.2f}s max={self.percentile(100):.2f}s"
+        )
+
+class DeliveryEngine:
+    """
+    Sends to many recipients at once, capped at `concurrency` in flight and `rate` starts per second.
+    discord.py still queues requests per route on top of this, so 429s stay rare.
+    """
+
+    def __init__(self, concurrency: int, rate: float):
+        self._concurrency = concurrency
+        self._limiter = RateLimiter(rate)
+
+    async def run(self, recipients: list, deliver: Callable[[any], Awaitable]) -> DeliveryReport:
+        """
+        Awaits `deliver(recipient)` for every recipient and returns a `DeliveryReport`.
+        A failed delivery is logged and does not stop the others.
+
+        Parameters
+        ----------
+        recipients: `list`
+        deliver: `Callable`
+            Coroutine function that handles a single recipient.
+        """
+
+        report = DeliveryReport()
+        semaphore = asyncio.Semaphore(self._concurrency)
+
+        async def worker(recipient) -> None:
+            async with semaphore:
+                await self._limiter.wait()
+                start = time.perf_counter()
+                try:
+                    await deliver(recipient)
+                except Exception as err:
+                    log(f"{err} - in delivery to {recipient}", level="ERROR")
+                    report.failed.add(recipient)
+                report.latencies[recipient] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        await asyncio.gather(*[worker(recipient) for recipient in recipients])
+        report.elapsed = time.perf_counter() - start
+
+        return report
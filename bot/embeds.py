@@ -1,8 +1,34 @@
 import discord
 
+from bisect import bisect_right
 from datetime import datetime
 
 from bot.user import User
+from bot.commands import COMMANDS
+
+from db.cache import TTLCache
+
+from config import FORECAST_EMBED_CACHE_SIZE, FORECAST_EMBED_CACHE_TTL, BOT_ICON
+
+def copy_embed(embed: discord.Embed) -> discord.Embed:
+    """
+    Returns a copy of `embed` that can be changed without touching the original. Cheaper than
+    `Embed.copy`, which round trips through a dict.
+    """
+
+    duplicate = discord.Embed.__new__(discord.Embed)
+    for name in discord.Embed.__slots__:
+        try:
+            value = getattr(embed, name)
+        except AttributeError:
+            # never set on this embed
+            continue
+        if type(value) is list:
+            value = [dict(item) for item in value]
+        elif type(value) is dict:
+            value = dict(value)
+        setattr(duplicate, name, value)
+    return duplicate
 
 
 class Forecast:
@@ -26,11 +52,32 @@ class Forecast:
             '0': "Yet another sunny day."
         }
     }
+    # `advice` as ascending thresholds and their messages per category, for bisecting
+    thresholds = {
+        category: (
+            [int(limit) for limit in sorted(messages, key=int)],
+            [messages[limit] for limit in sorted(messages, key=int)]
+        )
+        for category, messages in advice.items()
+    }
+    # built embeds keyed by (location, forecast date, source), with the data they were built from
+    embeds = TTLCache(maxsize=FORECAST_EMBED_CACHE_SIZE, ttl=FORECAST_EMBED_CACHE_TTL)
+
+    @classmethod
+    def friendly_advice(cls, data: dict) -> str:
+        # the message of the highest threshold reached in each category
+        advice = ""
+        for category, (limits, messages) in cls.thresholds.items():
+            index = bisect_right(limits, data[category])
+            if index > 0:
+                advice += messages[index - 1] + ' '
+        return advice
 
     @classmethod
     def generate(cls, data: {}) -> discord.Embed:
         """
-        Returns a forecast embed.
+        Returns a forecast embed. Users asking for the same forecast get copies of one embed,
+        built again only once the forecast changes.
 
         Parameters
         ----------
@@ -46,6 +93,8 @@ class Forecast:
                 Description of weather.\n
             source:`str`
                 Name of api source.
+            date:`str`
+                Local date of the forecast.
         """
         if not data:
             return discord.Embed(
@@ -54,19 +103,23 @@ class Forecast:
                 timestamp=datetime.now()
             )
 
+        key = (data['location'], data.get('date'), data['source'])
+        cached = cls.embeds.get(key)
+        # the same day's forecast is revised through the day
+        if cached is None or cached[0] != data:
+            cached = (dict(data), cls.build(data))
+            cls.embeds.set(key, cached)
+        return copy_embed(cached[1])
+
+    @classmethod
+    def build(cls, data: dict) -> discord.Embed:
         embed = discord.Embed(
             title=f"Forecast for {data['location']}!",
             color=discord.Color.random(),
             description="",
             timestamp=datetime.now()
         )
-        # generate friendly advice
-        advice = ""
-        for category in cls.advice:
-            for limit, msg in cls.advice[category].items():
-                if data[category] >= int(limit):
-                    advice += msg + ' '
-                    break
+        advice = cls.friendly_advice(data)
 
         embed.add_field(name=":thermometer: Highest Temperature", value=f"{data['highest_temperature']}°F")
         embed.add_field(name=":cloud_with_rain: Chance of rain", value=f"{data['rain']}%", inline=False)
@@ -172,4 +225,30 @@ class DailyCat:
         embed.set_image(url=data['url'])
         embed.set_footer(text=f"Supplied by {data['source']}")
     
-        return embed
\ No newline at end of file
+        return embed
+
+class Help:
+
+    # the command list only changes with a deploy, so it is built once
+    _embed: discord.Embed = None
+
+    @classmethod
+    def generate(cls) -> discord.Embed:
+        """
+        Returns the embed listing every command. Send it with the `BOT_ICON` asset attached.
+        """
+
+        if cls._embed is None:
+            embed = discord.Embed(
+                title="Mr. Weather Commands",
+                color=discord.Color.random()
+            )
+            embed.set_image(url=f"attachment://{BOT_ICON}")
+            # table headers
+
+            for command in COMMANDS:
+                embed.add_field(name="", value=f"**{command['name']}**", inline=False)
+                embed.add_field(name="", value=command['description'], inline=False)
+            cls._embed = embed
+
+        return copy_embed(cls._embed)
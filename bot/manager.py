@@ -1,25 +1,101 @@
 import discord
 
+import asyncio
+import functools
+import dataclasses
 import sqlite3
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
 
 from typing import Union
 
 from bot.user import User
 
-from db.database import Database
+from db.database import Database, ConnectionManager
+from db.cache import TTLCache
+
+from bot.metrics import Metrics
 
 from logs.log import log
 
+from config import USER_CACHE_SIZE, USER_CACHE_TTL, METRICS_BUCKETS
+
 # basically stores all data
 # controller for db operations
 class Manager:
-    def __init__(self, apis: dict, embeds: dict):
+    def __init__(self, apis: dict, embeds: dict, dbfile: str = "db/users.sqlite", lazy: bool = False):
         self._apis = apis
         self._embeds = embeds
 
-        self.dbfile = "db/users.sqlite"
+        self.dbfile = dbfile
+        # long-lived connections shared by every method below, opened by `setup`
+        self._connections: ConnectionManager = None
+        self._ready = False
+        self._setup_lock = threading.Lock()
+        # async variants run here so queries never block the event loop
+        # a single writer thread keeps writes in order, reads run side by side
+        self._write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-write")
+        self._read_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="db-read")
+        # hot users served from memory, kept current by every method that writes a user
+        self._users = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+        # bumped on every user write so reads that raced a write do not cache a stale row
+        self._users_version = 0
+        # latency of every api call and async database method, also fed by the bot's commands
+        self.metrics = Metrics(buckets=METRICS_BUCKETS)
+
+        if not lazy:
+            self.setup()
+
+    def setup(self) -> None:
+        """
+        Opens the database connections and creates the tables. A lazy Manager runs this on
+        first use, or earlier if called explicitly.
+        """
+
+        with self._setup_lock:
+            if self._ready:
+                return None
+            self._connections = ConnectionManager(self.dbfile, readers=4)
+            self.create_tables()
+            self._ready = True
+
+    async def setup_async(self) -> None:
+        await self._write(self.setup)
+
+    @property
+    def _db(self) -> ConnectionManager:
+        if not self._ready:
+            self.setup()
+        return self._connections
+
+    def close(self) -> None:
+        """
+        Closes the database connections held by the Manager.
+        """
 
-        self.create_tables()
+        self._write_executor.shutdown()
+        self._read_executor.shutdown()
+        if self._ready:
+            self._connections.close()
+
+    @property
+    def user_cache_stats(self) -> dict:
+        """
+        Hits, misses, size and hit rate of the in-memory user cache.
+        """
+
+        return self._users.stats
+
+    def _cache_user(self, user: User, version: int) -> None:
+        if version == self._users_version:
+            self._users.set(user.id, user)
+
+    def _update_cached_user(self, user_id: int, **changes: any) -> None:
+        self._users_version += 1
+        user = self._users.peek(user_id)
+        if user is not None:
+            self._users.set(user_id, dataclasses.replace(user, **changes))
 
     def embed(self, name: str, **kwargs: any) -> discord.Embed:
         """
@@ -47,7 +123,27 @@ class Manager:
             The specified api's required arguments
         """
 
-        return self._apis[name].extract(**kwargs)
+        with self.metrics.timer('api', name):
+            return self._apis[name].extract(**kwargs)
+
+    async def api_call_async(self, name: str, **kwargs) -> str:
+        """
+        Awaitable `api_call`. Uses the api's `extract_async` when it has one, otherwise runs
+        its `extract` in a worker thread so the event loop is never blocked.
+
+        Parameters
+        ----------
+        name: `str`
+            Name of an api set at a Manager object's initialization.
+        **kwargs: `any`
+            The specified api's required arguments
+        """
+
+        api = self._apis[name]
+        with self.metrics.timer('api', name):
+            if hasattr(api, 'extract_async'):
+                return await api.extract_async(**kwargs)
+            return await asyncio.to_thread(api.extract, **kwargs)
 
     def location_exists(self, name: str, location: str) -> bool:
         """
@@ -61,6 +157,21 @@ class Manager:
 
         return self._apis[name].location_exists(location)
 
+    async def location_exists_async(self, name: str, location: str) -> bool:
+        """
+        Awaitable `location_exists`.
+
+        Parameters
+        ----------
+        name: `str`
+            Name of an api set at a Manager object's initialization.
+        """
+
+        api = self._apis[name]
+        if hasattr(api, 'location_exists_async'):
+            return await api.location_exists_async(location)
+        return await asyncio.to_thread(api.location_exists, location)
+
     def get_user(self, user_id: int) -> User:
         """
         Returns a `User` object with data from the database.
@@ -79,15 +190,22 @@ class Manager:
             WHERE
                 id = ?
         """
+        user = self._users.get(user_id)
+        if user is not None:
+            return user
+
+        version = self._users_version
         tuppy = ()
         try:
-            with Database(self.dbfile) as db:
+            with self._db.session() as db:
                 db.execute(get_user_with_id, (user_id,))
                 tuppy = db.fetchone()
         except sqlite3.Error as err:
-            log(err + f" - in get_user(user_id={user_id})")
+            log(f"{err} - in get_user(user_id={user_id})", level="ERROR")
 
-        return Manager.convert_tuple_to_user(tuppy)
+        user = Manager.convert_tuple_to_user(tuppy)
+        self._cache_user(user, version)
+        return user
 
     def update_location(self, user_id: int, new_location: str) -> None:
         """
@@ -108,11 +226,12 @@ class Manager:
             WHERE id = ?
         """
         try:
-            with Database(self.dbfile) as db:
+            with self._db.session(write=True) as db:
                 db.execute(update_users_location, (new_location, user_id))
                 db.commit()
+            self._update_cached_user(user_id, location=new_location)
         except sqlite3.Error as err:
-            log(err + f" - in update_location(user_id={user_id}, new_location={new_location})")
+            log(f"{err} - in update_location(user_id={user_id}, new_location={new_location})", level="ERROR")
 
     def update_signup(self, user_id: int, is_signed_up: bool) -> None:
         """
@@ -133,11 +252,42 @@ class Manager:
             WHERE id = ?
         """
         try:
-            with Database(self.dbfile) as db:
+            with self._db.session(write=True) as db:
                 db.execute(update_user_signup, (+(is_signed_up), user_id))
                 db.commit()
+            self._update_cached_user(user_id, is_signed_up=+(is_signed_up))
         except sqlite3.Error as err:
-            log(err + f" - in update_signup(user_id={user_id}, is_signed_up={is_signed_up})")
+            log(f"{err} - in update_signup(user_id={user_id}, is_signed_up={is_signed_up})", level="ERROR")
+
+    def update_delivery_time(self, user_id: int, delivery_time: str, timezone: str) -> None:
+        """
+        Updates when a user receives their daily message.
+
+        Parameters
+        ----------
+        user_id: `int`
+            18 digit Discord user id.
+        delivery_time: `str`
+            Local time of day as HH:MM.
+        timezone: `str`
+            IANA timezone name.
+        """
+
+        update_user_delivery_time = """
+            UPDATE
+                users
+            SET
+                delivery_time = ?,
+                timezone = ?
+            WHERE id = ?
+        """
+        try:
+            with self._db.session(write=True) as db:
+                db.execute(update_user_delivery_time, (delivery_time, timezone, user_id))
+                db.commit()
+            self._update_cached_user(user_id, delivery_time=delivery_time, timezone=timezone)
+        except sqlite3.Error as err:
+            log(f"{err} - in update_delivery_time(user_id={user_id}, delivery_time={delivery_time}, timezone={timezone})", level="ERROR")
 
     def add_user(self, user: User) -> None:
         """
@@ -159,11 +309,76 @@ class Manager:
                 ) VALUES(?, ?, ?, ?, ?)
         """
         try:
-            with Database(self.dbfile) as db:
+            with self._db.session(write=True) as db:
                 db.execute(populate_table, (user.id, user.display_name, user.display_avatar, user.location, +(user.is_signed_up)))
                 db.commit()
+            self._users_version += 1
+            self._users.set(user.id, dataclasses.replace(user, is_signed_up=+(user.is_signed_up)))
+        except sqlite3.Error as err:
+            log(f"{err} - in add_user(user={user})", level="ERROR")
+
+    def _fresh_cached_user(self, user: User) -> User:
+        cached = self._users.get(user.id)
+        if cached is not None and (cached.display_name, cached.display_avatar) == (user.display_name, user.display_avatar):
+            return cached
+        return None
+
+    def ensure_user(self, user: User) -> User:
+        """
+        Adds a `User` to the database if they are not in it yet, refreshing their display name and
+        avatar if those changed, and returns the stored `User`. Safe to call any number of times.
+
+        Parameters
+        ----------
+        user: `User`
+            Location and signup status are only used when the user is new.
+        """
+
+        cached = self._fresh_cached_user(user)
+        if cached is not None:
+            return cached
+
+        upsert_user = """
+            INSERT INTO users
+                (
+                    id,
+                    display_name,
+                    display_avatar,
+                    location,
+                    is_signed_up
+                ) VALUES(?, ?, ?, ?, ?)
+            ON CONFLICT (id) DO UPDATE SET
+                display_name = excluded.display_name,
+                display_avatar = excluded.display_avatar
+            WHERE
+                display_name IS NOT excluded.display_name
+            OR
+                display_avatar IS NOT excluded.display_avatar
+        """
+        get_user_with_id = """
+            SELECT
+                *
+            FROM
+                users
+            WHERE
+                id = ?
+        """
+        tuppy = None
+        try:
+            with self._db.session(write=True) as db:
+                db.execute(upsert_user, (user.id, user.display_name, user.display_avatar, user.location, +(user.is_signed_up)))
+                db.execute(get_user_with_id, (user.id,))
+                tuppy = db.fetchone()
+                db.commit()
         except sqlite3.Error as err:
-            log(err + f" - in add_user(user={User})")
+            log(f"{err} - in ensure_user(user={user})", level="ERROR")
+
+        if tuppy is None:
+            return user
+        self._users_version += 1
+        stored = Manager.convert_tuple_to_user(tuppy)
+        self._users.set(stored.id, stored)
+        return stored
 
     def exists_user(self, user_id: int) -> bool:
         """
@@ -175,19 +390,30 @@ class Manager:
             18 digit Discord user id.
         """
 
+        if self._users.get(user_id) is not None:
+            return True
+
+        # fetch the whole row so the get_user that usually follows is a cache hit
         get_user = """
             SELECT
-                1
+                *
             FROM
                 users
             WHERE id = ?
         """
+        version = self._users_version
         try:
-            with Database(self.dbfile) as db:
+            with self._db.session() as db:
                 db.execute(get_user, (user_id,))
-                return db.fetchone() is not None
+                tuppy = db.fetchone()
         except sqlite3.Error as err:
-            log(err + f" - in exists_user(user_id={user_id})")
+            log(f"{err} - in exists_user(user_id={user_id})", level="ERROR")
+            return None
+
+        if tuppy is None:
+            return False
+        self._cache_user(Manager.convert_tuple_to_user(tuppy), version)
+        return True
 
     def get_signed_up(self) -> list[User]:
         """
@@ -207,14 +433,70 @@ class Manager:
         """
         tuppies = []
         try:
-            with Database(self.dbfile) as db:
+            with self._db.session() as db:
                 db.execute(find_signed_up)
                 tuppies = db.fetchall()
         except sqlite3.Error as err:
-            log(err + f"- in get_signed_up")
+            log(f"{err} - in get_signed_up", level="ERROR")
 
         return [id[0] for id in tuppies]
 
+    def get_signed_up_locations(self) -> dict[str, list[int]]:
+        """
+        Returns the ids of signed up users grouped by their location.
+
+        Parameters
+        ----------
+        None
+        """
+        find_signed_up_locations = """
+            SELECT
+                location,
+                id
+            FROM
+                users
+            WHERE
+                is_signed_up = 1
+        """
+        tuppies = []
+        try:
+            with self._db.session() as db:
+                db.execute(find_signed_up_locations)
+                tuppies = db.fetchall()
+        except sqlite3.Error as err:
+            log(f"{err} - in get_signed_up_locations", level="ERROR")
+
+        locations = {}
+        for location, id in tuppies:
+            locations.setdefault(location, []).append(id)
+        return locations
+
+    def get_signed_up_users(self) -> list[User]:
+        """
+        Returns a list of `User` objects whose `is_signed_up` attribute is true.
+
+        Parameters
+        ----------
+        None
+        """
+        find_signed_up = """
+            SELECT
+                *
+            FROM
+                users
+            WHERE
+                is_signed_up = 1
+        """
+        tuppies = []
+        try:
+            with self._db.session() as db:
+                db.execute(find_signed_up)
+                tuppies = db.fetchall()
+        except sqlite3.Error as err:
+            log(f"{err} - in get_signed_up_users", level="ERROR")
+
+        return Manager.convert_tuple_to_user(tuppies)
+
     def add_reminder(self, user_id: int, reminder: str) -> None:
         """
         Adds a user's reminder to the database. Reminders are automatically indexed.
@@ -229,27 +511,55 @@ class Manager:
         if reminder == "":
             return None
 
-        get_cur_r_index = """
-            SELECT
-                COUNT(reminder)
-            FROM
-                reminders
-            WHERE
-                owner_id = ?
+        # r_index only orders a user's reminders, so it may have gaps
+        # picking the next one in the same statement keeps concurrent adds from colliding
+        add_reminder = """
+            INSERT INTO reminders
+                (owner_id, r_index, reminder)
+                VALUES(
+                    ?,
+                    (SELECT COALESCE(MAX(r_index) + 1, 0) FROM reminders WHERE owner_id = ?),
+                    ?
+                )
+        """
+        try:
+            with self._db.session(write=True) as db:
+                db.execute(add_reminder, (user_id, user_id, reminder))
+                db.commit()
+        except sqlite3.Error as err:
+            log(f"{err} - in add_reminder(user_id={user_id}, reminder={reminder})", level="ERROR")
+
+    def add_reminders(self, user_id: int, reminders: list[str]) -> None:
+        """
+        Adds any number of a user's reminders to the database in a single transaction, in order.
+        Empty reminders are skipped.
+
+        Parameters
+        ----------
+        user_id: `int`
+            18 digit Discord user id.
+        reminders: `list[str]`
         """
+
+        reminders = [reminder for reminder in reminders if reminder != ""]
+        if not reminders:
+            return None
+
         add_reminder = """
             INSERT INTO reminders
                 (owner_id, r_index, reminder)
-                VALUES(?, ?, ?)
+                VALUES(
+                    ?,
+                    (SELECT COALESCE(MAX(r_index) + 1, 0) FROM reminders WHERE owner_id = ?),
+                    ?
+                )
         """
         try:
-            with Database(self.dbfile) as db:
-                db.execute(get_cur_r_index, (user_id,))
-                r_index = db.fetchone()[0]
-                db.execute(add_reminder, (user_id, r_index, reminder))
+            with self._db.session(write=True) as db:
+                db.cursor.executemany(add_reminder, [(user_id, user_id, reminder) for reminder in reminders])
                 db.commit()
         except sqlite3.Error as err:
-            log(err + f" - in add_reminder(user_id={user_id}, reminder={reminder})")
+            log(f"{err} - in add_reminders(user_id={user_id}, reminders={len(reminders)})", level="ERROR")
 
     def remove_reminder(self, user_id: int, index: int) -> None:
         """
@@ -265,46 +575,33 @@ class Manager:
 
         if index < 0:
             raise IndexError
-        
-        try:
-            with Database(self.dbfile) as db:
-                max = len(self.get_reminders(user_id))
-                if index >= max:
-                    raise IndexError
-        
-                delete_reminder = """
-                    DELETE FROM
+
+        # the reminder at `index` is the one with `index` reminders ordered before it
+        # later reminders keep their r_index, so nothing needs shifting
+        delete_reminder = """
+            DELETE FROM
+                reminders
+            WHERE
+                rowid = (
+                    SELECT
+                        rowid
+                    FROM
                         reminders
                     WHERE
                         owner_id = ?
-                    AND
-                        r_index = ?
-                """
-                try:
-                    db.execute(delete_reminder, (user_id, index))
-                except sqlite3.Error as err:
-                    log(err + f" - in delete_reminder in remove_reminder(user_id={user_id}, index={index})")
-                # subtract one to the indexes of reminders higher than the index removed 
-                # simulates removal from an array
-                while index < max:
-                    reorder_indexes = """
-                        UPDATE
-                            reminders
-                        SET
-                            r_index = ?
-                        WHERE
-                            owner_id = ?
-                        AND
-                            r_index = ?
-                    """
-                    try:
-                        db.execute(reorder_indexes, (index, user_id, index+1))
-                    except sqlite3.Error as err:
-                        log(err + f" - in reorder_indexes(index={index}, user_id={user_id}, index={index+1} in remove_reminders(user_id={user_id}, index={index}))")
-                    index += 1
+                    ORDER BY
+                        r_index ASC
+                    LIMIT 1 OFFSET ?
+                )
+        """
+        try:
+            with self._db.session(write=True) as db:
+                db.execute(delete_reminder, (user_id, index))
+                if db.cursor.rowcount == 0:
+                    raise IndexError
                 db.commit()
         except sqlite3.Error as err:
-            log(err + f" - in remove_reminder(user_id={user_id}, index={index})")
+            log(f"{err} - in remove_reminder(user_id={user_id}, index={index})", level="ERROR")
 
     def get_reminders(self, user_id: int) -> list[str]:
         """
@@ -328,11 +625,11 @@ class Manager:
         """
         tuppy = ()
         try:
-            with Database(self.dbfile) as db:
+            with self._db.session() as db:
                 db.execute(get_user_reminders, (user_id,))
                 tuppy = db.fetchall()
         except sqlite3.Error as err:
-            log(err + f" - in get_reminders(user_id={user_id})")        
+            log(f"{err} - in get_reminders(user_id={user_id})", level="ERROR")
         if tuppy is None:
             return []
         else:
@@ -340,18 +637,18 @@ class Manager:
 
     def create_tables(self) -> None:
         try:
-            with Database(self.dbfile) as db:
+            with self._connections.session(write=True) as db:
                 try:
                     self.create_users_table(db)
                 except sqlite3.Error as err:
-                    log(err + f" - in create_users_table")
+                    log(f"{err} - in create_users_table", level="ERROR")
                 try:
                     self.create_reminders_table(db)
                 except sqlite3.Error as err:
-                    log(err + f" - in create_reminders_table")
+                    log(f"{err} - in create_reminders_table", level="ERROR")
                 db.commit()
         except sqlite3.Error as err:
-            log(err + f" - in create_tables")
+            log(f"{err} - in create_tables", level="ERROR")
 
     def create_reminders_table(self, db: Database) -> None:
         reminders_table = """
@@ -363,7 +660,35 @@ class Manager:
                     FOREIGN KEY (owner_id) REFERENCES users (id)
                 );
         """
+        # serves ordered lookups of one user's reminders and rejects duplicate positions
+        reminders_index = """
+            CREATE UNIQUE INDEX IF NOT EXISTS
+                reminders_owner_order ON reminders (owner_id, r_index);
+        """
+        # earlier versions could store two reminders at one position, which the index rejects,
+        # so each user's reminders are renumbered 0, 1, 2... once, before it is created
+        renumber_reminders = """
+            UPDATE
+                reminders
+            SET
+                r_index = numbered.position
+            FROM (
+                SELECT
+                    rowid AS id,
+                    ROW_NUMBER() OVER (PARTITION BY owner_id ORDER BY r_index, rowid) - 1 AS position
+                FROM
+                    reminders
+            ) AS numbered
+            WHERE
+                reminders.rowid = numbered.id
+            AND
+                reminders.r_index != numbered.position
+        """
         db.execute(reminders_table)
+        db.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'reminders_owner_order'")
+        if db.fetchone() is None:
+            db.execute(renumber_reminders)
+        db.execute(reminders_index)
 
     def create_users_table(self, db: Database) -> None:
         users_table = """
@@ -373,11 +698,77 @@ class Manager:
                     display_name TEXT NOT NULL,
                     display_avatar TEXT NOT NULL,
                     location TEXT NOT NULL,
-                    is_signed_up BIT default 0
+                    is_signed_up BIT default 0,
+                    delivery_time TEXT,
+                    timezone TEXT
                 );
         """
         db.execute(users_table)
 
+        # tables made before per-user delivery times lack these columns
+        db.execute("PRAGMA table_info(users)")
+        columns = {column[1] for column in db.fetchall()}
+        for column in ("delivery_time", "timezone"):
+            if column not in columns:
+                db.execute(f"ALTER TABLE users ADD COLUMN {column} TEXT")
+
+    # timings include the wait for a free thread, which is what callers experience
+    async def _read(self, fn, *args) -> any:
+        with self.metrics.timer('db', fn.__name__):
+            return await asyncio.get_running_loop().run_in_executor(self._read_executor, functools.partial(fn, *args))
+
+    async def _write(self, fn, *args) -> any:
+        with self.metrics.timer('db', fn.__name__):
+            return await asyncio.get_running_loop().run_in_executor(self._write_executor, functools.partial(fn, *args))
+
+    # awaitable variants for use on the event loop
+    # same arguments and return values as their blocking counterparts
+    async def get_user_async(self, user_id: int) -> User:
+        return await self._read(self.get_user, user_id)
+
+    async def ensure_user_async(self, user: User) -> User:
+        # most calls are cache hits, which need no trip to the writer thread
+        cached = self._fresh_cached_user(user)
+        if cached is not None:
+            return cached
+        return await self._write(self.ensure_user, user)
+
+    async def exists_user_async(self, user_id: int) -> bool:
+        return await self._read(self.exists_user, user_id)
+
+    async def get_signed_up_async(self) -> list[int]:
+        return await self._read(self.get_signed_up)
+
+    async def get_signed_up_locations_async(self) -> dict[str, list[int]]:
+        return await self._read(self.get_signed_up_locations)
+
+    async def get_reminders_async(self, user_id: int) -> list[str]:
+        return await self._read(self.get_reminders, user_id)
+
+    async def get_signed_up_users_async(self) -> list[User]:
+        return await self._read(self.get_signed_up_users)
+
+    async def update_delivery_time_async(self, user_id: int, delivery_time: str, timezone: str) -> None:
+        await self._write(self.update_delivery_time, user_id, delivery_time, timezone)
+
+    async def add_user_async(self, user: User) -> None:
+        await self._write(self.add_user, user)
+
+    async def update_location_async(self, user_id: int, new_location: str) -> None:
+        await self._write(self.update_location, user_id, new_location)
+
+    async def update_signup_async(self, user_id: int, is_signed_up: bool) -> None:
+        await self._write(self.update_signup, user_id, is_signed_up)
+
+    async def add_reminder_async(self, user_id: int, reminder: str) -> None:
+        await self._write(self.add_reminder, user_id, reminder)
+
+    async def add_reminders_async(self, user_id: int, reminders: list[str]) -> None:
+        await self._write(self.add_reminders, user_id, reminders)
+
+    async def remove_reminder_async(self, user_id: int, index: int) -> None:
+        await self._write(self.remove_reminder, user_id, index)
+
     @staticmethod
     def convert_tuple_to_user(welovetuples: Union[tuple, list[tuple]]) -> Union[User, list[User]]:
         """
@@ -393,12 +784,12 @@ class Manager:
         assert isinstance(welovetuples, tuple) or isinstance(welovetuples, list)
 
         if isinstance(welovetuples, tuple):
-            id, dn, da, l, isu = welovetuples
-            return User(id=id, display_name=dn, display_avatar=da, location=l, is_signed_up=isu)
+            id, dn, da, l, isu, dt, tz = welovetuples
+            return User(id=id, display_name=dn, display_avatar=da, location=l, is_signed_up=isu, delivery_time=dt, timezone=tz)
         elif isinstance(welovetuples, list):
             users = []
             for tuppy in welovetuples:
-                id, dn, da, l, isu = tuppy
-                users += [User(id=id, display_name=dn, display_avatar=da, location=l, is_signed_up=isu)]
+                id, dn, da, l, isu, dt, tz = tuppy
+                users += [User(id=id, display_name=dn, display_avatar=da, location=l, is_signed_up=isu, delivery_time=dt, timezone=tz)]
 
             return users
\ No newline at end of file
@@ -0,0 +1,129 @@
+import os
+import threading
+import time
+
+from bisect import bisect_left
+from contextlib import contextmanager
+
+class Histogram:
+    """
+    Latency histogram with fixed upper bounds in seconds, plus a count of failed calls.
+    Percentiles are estimated by interpolating inside the bucket they fall in.
+    """
+
+    def __init__(self, buckets: tuple[float]):
+        self.buckets = buckets
+        # one extra slot for everything above the last bound
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.errors = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float, error: bool = False) -> None:
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if error:
+            self.errors += 1
+
+    def percentile(self, p: float) -> float:
+        if self.count == 0:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                low = self.buckets[index - 1] if index > 0 else 0.0
+                return low + (self.buckets[index] - low) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+class Metrics:
+    """
+    Registry of latency histograms keyed by kind (command, api, db, task) and name.
+    Safe to record from worker threads.
+    """
+
+    def __init__(self, buckets: tuple[float]):
+        self.buckets = tuple(sorted(buckets))
+        self._histograms: dict[tuple[str, str], Histogram] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, kind: str, name: str, seconds: float, error: bool = False) -> None:
+        with self._lock:
+            histogram = self._histograms.get((kind, name))
+            if histogram is None:
+                histogram = self._histograms[(kind, name)] = Histogram(self.buckets)
+            histogram.observe(seconds, error)
+
+    @contextmanager
+    def timer(self, kind: str, name: str):
+        """
+        Records how long the block takes, counting it as an error if it raises.
+        Also usable around an `await`.
+        """
+
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.observe(kind, name, time.perf_counter() - start, error=True)
+            raise
+        self.observe(kind, name, time.perf_counter() - start)
+
+    def snapshot(self) -> dict[tuple[str, str], dict]:
+        """
+        Count, errors, mean and estimated p50/p95/p99 in seconds for every recorded name.
+        """
+
+        with self._lock:
+            return {
+                key: {
+                    'count': histogram.count,
+                    'errors': histogram.errors,
+                    'mean': histogram.sum / histogram.count if histogram.count else 0.0,
+                    'p50': histogram.percentile(50),
+                    'p95': histogram.percentile(95),
+                    'p99': histogram.percentile(99)
+                }
+                for key, histogram in sorted(self._histograms.items())
+            }
+
+    def to_prometheus(self, prefix: str = "mrweather") -> str:
+        """
+        All histograms and error counters in the Prometheus text exposition format.
+        """
+
+        latency, errors = [], []
+        with self._lock:
+            for (kind, name), histogram in sorted(self._histograms.items()):
+                labels = f'kind="{kind}",name="{name}"'
+                cumulative = 0
+                for bound, count in zip(self.buckets, histogram.counts):
+                    cumulative += count
+                    latency.append(f'{prefix}_latency_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                latency.append(f'{prefix}_latency_seconds_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                latency.append(f'{prefix}_latency_seconds_sum{{{labels}}} {histogram.sum}')
+                latency.append(f'{prefix}_latency_seconds_count{{{labels}}} {histogram.count}')
+                errors.append(f'{prefix}_errors_total{{{labels}}} {histogram.errors}')
+
+        return "\n".join([
+            f"# HELP {prefix}_latency_seconds Time taken by commands, api calls, database methods and tasks.",
+            f"# TYPE {prefix}_latency_seconds histogram",
+            *latency,
+            f"# HELP {prefix}_errors_total Calls that raised.",
+            f"# TYPE {prefix}_errors_total counter",
+            *errors
+        ]) + "\n"
+
+    def write(self, path: str) -> None:
+        """
+        Writes `to_prometheus` to `path`, replacing it atomically so scrapers never see half a file.
+        """
+
+        text = self.to_prometheus()
+        with open(f"{path}.tmp", "w") as file:
+            file.write(text)
+        os.replace(f"{path}.tmp", path)
@@ -0,0 +1,125 @@
+import asyncio
+import datetime
+import heapq
+
+from typing import Awaitable, Callable
+from zoneinfo import ZoneInfo
+
+from logs.log import log
+
+from config import TIME
+
+def next_due(delivery_time: datetime.time, timezone: str, after: datetime.datetime, offset: datetime.timedelta = datetime.timedelta()) -> datetime.datetime:
+    """
+    Returns the first moment after `after` that is `offset` before `delivery_time` in `timezone`.
+
+    Parameters
+    ----------
+    delivery_time: `datetime.time`
+        Local time of day. `None` uses `TIME`.
+    timezone: `str`
+        IANA timezone name. `None` uses the timezone of `TIME`.
+    after: `datetime.datetime`
+        Timezone aware.
+    offset: `datetime.timedelta`
+    """
+
+    if delivery_time is None:
+        delivery_time, zone = TIME.replace(tzinfo=None), TIME.tzinfo
+    else:
+        zone = ZoneInfo(timezone) if timezone else TIME.tzinfo
+
+    # start a day early in case the offset reaches back past midnight
+    day = after.astimezone(zone).date() - datetime.timedelta(days=1)
+    while True:
+        due = datetime.datetime.combine(day, delivery_time, tzinfo=zone) - offset
+        if due > after:
+            return due
+        day += datetime.timedelta(days=1)
+
+class DeliveryScheduler:
+    """
+    Keeps every user's next daily delivery in a min-heap and sleeps until the earliest one is
+    due, so it only wakes when there is work to do. Users due at the same moment are handed to
+    `on_due` together, then rescheduled for the next day.
+    """
+
+    def __init__(self, on_due: Callable[[list[int]], Awaitable], offset: datetime.timedelta = datetime.timedelta()):
+        self._on_due = on_due
+        self._offset = offset
+
+        # (due timestamp, user id), stale entries are skipped when popped
+        self._heap: list[tuple[float, int]] = []
+        # user id -> (delivery time, timezone, due timestamp) of live entries
+        self._entries: dict[int, tuple] = {}
+        self._wakeup = asyncio.Event()
+        self._batches: set[asyncio.Task] = set()
+        self._task: asyncio.Task = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def schedule(self, user_id: int, delivery_time: datetime.time = None, timezone: str = None) -> None:
+        """
+        Schedules or reschedules a user's daily delivery.
+
+        Parameters
+        ----------
+        user_id: `int`
+            18 digit Discord user id.
+        delivery_time: `datetime.time`
+            Local time of day. `None` uses `TIME`.
+        timezone: `str`
+            IANA timezone name.
+        """
+
+        due = next_due(delivery_time, timezone, datetime.datetime.now(datetime.timezone.utc), self._offset).timestamp()
+        self._entries[user_id] = (delivery_time, timezone, due)
+        if not self._heap or due < self._heap[0][0]:
+            self._wakeup.set()
+        heapq.heappush(self._heap, (due, user_id))
+
+    def cancel(self, user_id: int) -> None:
+        self._entries.pop(user_id, None)
+
+    def start(self) -> None:
+        if not self.is_running:
+            self._task = asyncio.create_task(self.run())
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            now = datetime.datetime.now(datetime.timezone.utc)
+            batch = []
+            while self._heap and self._heap[0][0] <= now.timestamp():
+                due, user_id = heapq.heappop(self._heap)
+                entry = self._entries.get(user_id)
+                if entry is None or entry[2] != due:
+                    continue
+                batch.append(user_id)
+                delivery_time, timezone, _ = entry
+                following = next_due(delivery_time, timezone, datetime.datetime.fromtimestamp(due, datetime.timezone.utc), self._offset).timestamp()
+                self._entries[user_id] = (delivery_time, timezone, following)
+                heapq.heappush(self._heap, (following, user_id))
+
+            if batch:
+                task = loop.create_task(self._run_batch(batch))
+                self._batches.add(task)
+                task.add_done_callback(self._batches.discard)
+
+            self._wakeup.clear()
+            timeout = self._heap[0][0] - now.timestamp() if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run_batch(self, user_ids: list[int]) -> None:
+        try:
+            await self._on_due(user_ids)
+        except Exception as err:
+            log(f"{err} - in DeliveryScheduler batch of {len(user_ids)} users", level="ERROR")
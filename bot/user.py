@@ -9,4 +9,7 @@ class User:
     display_name: str
     display_avatar: str
     location: str = DEFAULT_LOCATION
-    is_signed_up: bool = False
\ No newline at end of file
+    is_signed_up: bool = False
+    # local HH:MM and IANA timezone of the daily message, None for the default TIME
+    delivery_time: str = None
+    timezone: str = None
\ No newline at end of file
@@ -2,12 +2,123 @@ import datetime
 
 """Constants and setup"""
 # What time the bot sends a user daily messages
-# 7:30 AM PST by default
+# 7:30 AM PST by default, users may pick their own with /delivery-time
 TIME = datetime.time(hour=14, minute=30, tzinfo=datetime.timezone.utc)
+# Suggested timezone for /delivery-time
+DEFAULT_TIMEZONE = "America/Los_Angeles"
+# Content shared by every daily message is generated this long before TIME
+PREPARE_OFFSET = datetime.timedelta(minutes=10)
+PREPARE_TIME = (datetime.datetime.combine(datetime.date.today(), TIME) - PREPARE_OFFSET).timetz()
+# Subscribers' forecasts are fetched into the forecast cache this long before their delivery
+WARMUP_OFFSET = datetime.timedelta(minutes=30)
+# most forecasts fetched at once while warming up
+WARMUP_CONCURRENCY = 8
 # Text API settings
-MOTIVATION_PROMPT = f"Generate a completely unique philosopical daily motivational quote that is perfect to start the day with, but with a humourous and quirky twist, using {datetime.datetime.now()} as a random seed"
+MOTIVATION_PROMPT_TEMPLATE = "Generate a completely unique philosopical daily motivational quote that is perfect to start the day with, but with a humourous and quirky twist, using {seed} as a random seed"
 # Personality is the prefix of all prompts sent to the text api
 PERSONALITY = "Take on the personality of a funny, intelligent, and curious person when replying to this message: "
 COMMAND_PREFIX = '/'
 DEFAULT_LOCATION = "Irvine"
-LOGGING = True
\ No newline at end of file
+LOGGING = True
+# log file, rotated once it passes LOG_MAX_BYTES or a new day starts, keeping LOG_BACKUPS old files
+LOG_FILE = "logs/logs.txt"
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUPS = 5
+# write records as JSON lines instead of plain text
+LOG_JSON = False
+# most records written by one write to the file
+LOG_BATCH_SIZE = 256
+# Files sent as attachments, read into memory once
+ASSETS_DIR = "assets"
+BOT_ICON = "bot_icon.jpg"
+# Open the database and load the text api after connecting to Discord rather than at import
+LAZY_STARTUP = True
+
+# HTTP client settings
+# seconds allowed for a whole request and for opening a connection
+HTTP_TIMEOUT = 10
+HTTP_CONNECT_TIMEOUT = 3
+# pooled connections kept open across requests
+HTTP_POOL_SIZE = 100
+HTTP_KEEPALIVE = 30
+# most requests in flight to one upstream api at a time
+HTTP_UPSTREAM_LIMITS = {
+    'weather': 10,
+    'cat': 5
+}
+
+# Daily message delivery
+# recipients processed at once, and most DMs started per second
+DAILY_CONCURRENCY = 20
+DAILY_RATE = 25
+
+# In-memory user cache
+USER_CACHE_SIZE = 4096
+# seconds
+USER_CACHE_TTL = 600
+
+# Weather location resolution
+# user input is matched case-insensitively, and aliases map to what the weather api expects
+LOCATION_ALIASES = {
+    'la': "Los Angeles",
+    'sf': "San Francisco",
+    'nyc': "New York"
+}
+LOCATION_CACHE_SIZE = 1024
+# seconds a found location, and an unknown location, is remembered
+LOCATION_CACHE_TTL = 4 * 60 * 60
+LOCATION_NEGATIVE_TTL = 10 * 60
+
+# Forecast cache
+# parsed forecasts kept in memory, and in a file that survives restarts
+FORECAST_CACHE_FILE = "db/forecasts.sqlite"
+FORECAST_CACHE_SIZE = 1024
+FORECAST_CACHE_DISK_SIZE = 10000
+# seconds, forecasts also expire at local midnight
+FORECAST_CACHE_MAX_AGE = 4 * 60 * 60
+
+# Forecast embeds shared by users asking for the same forecast, rebuilt after this many seconds
+FORECAST_EMBED_CACHE_SIZE = 1024
+FORECAST_EMBED_CACHE_TTL = 10 * 60
+
+# Upstream base urls, pointed at `python -m fakes` for offline load tests
+# WEATHER_BASE is kept in secret.py with the weather key
+CAT_BASE = "https://api.thecatapi.com/v1"
+# None uses the client library's default endpoint, any other value switches it to REST
+PALM_BASE = None
+
+# Cat image pool
+# urls fetched per request, and how few unseen ones trigger a background refill
+CAT_POOL_SIZE = 50
+CAT_POOL_LOW_WATER = 10
+# seconds to wait after a failed refill before asking the api again
+CAT_REFILL_BACKOFF = 60
+
+# Text api
+# most generations running at once, and how long (seconds) a prompt's reply is reused
+PALM_CONCURRENCY = 4
+PALM_CACHE_SIZE = 256
+PALM_CACHE_TTL = 60 * 60
+
+# Motivational quote pool
+# quotes kept ready, and recently served quotes remembered to avoid repeats
+QUOTE_POOL_FILE = "db/quotes.json"
+QUOTE_POOL_SIZE = 30
+QUOTE_HISTORY = 1000
+# the pool is topped up by this many quotes every few minutes while the text api is idle
+QUOTE_REFILL_BATCH = 5
+QUOTE_REFILL_MINUTES = 5
+
+# Text api model discovery
+# the model name is looked up once and kept on disk, refreshed after this many seconds
+PALM_MODEL_FILE = "db/palm_model.json"
+PALM_MODEL_REFRESH = 24 * 60 * 60
+
+# Metrics
+# latency histogram bounds in seconds
+METRICS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Prometheus text snapshot, rewritten every few minutes
+METRICS_FILE = "logs/metrics.prom"
+METRICS_SNAPSHOT_MINUTES = 1
+# Discord user ids allowed to run /stats, besides the application owner
+ADMIN_IDS = []
@@ -0,0 +1,80 @@
+import threading
+import time
+
+from collections import OrderedDict
+
+class TTLCache:
+    """
+    Thread-safe in-memory cache. Holds at most `maxsize` entries, evicting the least recently
+    used, and forgets each entry `ttl` seconds after it was set.
+    """
+
+    _missing = object()
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: any, default: any = None) -> any:
+        with self._lock:
+            expires, value = self._entries.get(key, (0, TTLCache._missing))
+            if value is TTLCache._missing or expires <= time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def peek(self, key: any, default: any = None) -> any:
+        """
+        Like `get`, but leaves recency and hit/miss counters untouched.
+        """
+
+        with self._lock:
+            expires, value = self._entries.get(key, (0, TTLCache._missing))
+            if value is TTLCache._missing or expires <= time.monotonic():
+                return default
+            return value
+
+    def set(self, key: any, value: any, ttl: float = None) -> None:
+        """
+        Stores `value` under `key`.
+
+        Parameters
+        ----------
+        ttl: `float`
+            Seconds until the entry expires. Defaults to the cache's `ttl`.
+        """
+
+        with self._lock:
+            self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def pop(self, key: any) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._entries),
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
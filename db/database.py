@@ -1,16 +1,22 @@
+import queue
 import sqlite3
+import threading
+
+from contextlib import contextmanager
 
 class Database:
 
-    def __init__(self, dbfile: str):
-        self._conn = sqlite3.connect(dbfile)
+    def __init__(self, dbfile: str, connection: sqlite3.Connection = None):
+        # a borrowed connection belongs to a ConnectionManager and outlives this object
+        self._owns_connection = connection is None
+        self._conn = sqlite3.connect(dbfile) if connection is None else connection
         self._cursor = self._conn.cursor()
 
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.close()
+        self.close(commit=exc_type is None)
 
     @property
     def connection(self) -> sqlite3.Connection:
@@ -23,10 +29,17 @@ class Database:
     def commit(self) -> None:
         self.connection.commit()
 
+    def rollback(self) -> None:
+        self.connection.rollback()
+
     def close(self, commit=True) -> None:
         if commit:
             self.commit()
-        self.connection.close()
+        else:
+            self.rollback()
+        self.cursor.close()
+        if self._owns_connection:
+            self.connection.close()
 
     def execute(self, sql, params=()) -> None:
         self.cursor.execute(sql, params)
@@ -35,4 +48,68 @@ class Database:
         return self.cursor.fetchone()
 
     def fetchall(self) -> list[tuple]:
-        return self.cursor.fetchall()
\ No newline at end of file
+        return self.cursor.fetchall()
+
+class ConnectionManager:
+    """
+    Keeps long-lived connections to a database file and lends them out as `Database` sessions.
+
+    Writes share a single connection guarded by a lock. Reads draw from a small pool of
+    connections, which WAL journaling lets run alongside the writer. Every connection keeps
+    its own cache of prepared statements, so repeated queries skip the sqlite parser.
+    """
+
+    pragmas = (
+        "PRAGMA journal_mode = WAL",
+        "PRAGMA synchronous = NORMAL",
+        "PRAGMA temp_store = MEMORY",
+        "PRAGMA cache_size = -8000",
+        "PRAGMA busy_timeout = 5000"
+    )
+
+    def __init__(self, dbfile: str, readers: int = 4, cached_statements: int = 128):
+        self.dbfile = dbfile
+        self._cached_statements = cached_statements
+
+        self._write_lock = threading.Lock()
+        self._writer = self._connect()
+        self._readers = queue.Queue()
+        for _ in range(readers):
+            self._readers.put(self._connect())
+
+    def _connect(self) -> sqlite3.Connection:
+        # connections are handed between threads, but never used by two at once
+        conn = sqlite3.connect(self.dbfile, check_same_thread=False, cached_statements=self._cached_statements)
+        for pragma in self.pragmas:
+            conn.execute(pragma)
+        return conn
+
+    @contextmanager
+    def session(self, write: bool = False):
+        """
+        Borrows a connection for the duration of a `with` block. Commits on a clean exit and
+        rolls back otherwise.
+
+        Parameters
+        ----------
+        write: `bool`
+            Whether the block modifies the database. Writes are serialized.
+        """
+
+        if write:
+            with self._write_lock:
+                with Database(self.dbfile, connection=self._writer) as db:
+                    yield db
+        else:
+            conn = self._readers.get()
+            try:
+                with Database(self.dbfile, connection=conn) as db:
+                    yield db
+            finally:
+                self._readers.put(conn)
+
+    def close(self) -> None:
+        with self._write_lock:
+            self._writer.close()
+        while not self._readers.empty():
+            self._readers.get_nowait().close()
@@ -0,0 +1,78 @@
+"""
+Runs the fake upstreams until interrupted.
+
+Replay (or make up) responses with 100ms +- 50ms of latency and 2% of requests failing:
+    python -m fakes --recordings fakes/recordings.json --latency 0.1 --jitter 0.05 --error-rate 0.02
+
+Record from the real apis, through which the bot's requests are forwarded:
+    python -m fakes --recordings fakes/recordings.json --record
+
+Then point the bot at http://127.0.0.1:8765, with WEATHER_BASE and CAT_BASE set to
+http://127.0.0.1:8765/v1 and PALM_BASE to http://127.0.0.1:8765.
+"""
+import argparse
+import asyncio
+
+from fakes.server import Fault, FakeUpstreams
+
+UPSTREAMS = ('weather', 'cat', 'palm')
+REAL_BASES = {
+    'weather': "https://api.weatherapi.com/v1",
+    'cat': "https://api.thecatapi.com/v1",
+    'palm': "https://generativelanguage.googleapis.com"
+}
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="python -m fakes", description="Local stand-ins for the weather, cat and PaLM apis.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--recordings", help="json file of recorded responses to replay, or to record into")
+    parser.add_argument("--record", action="store_true", help="forward requests to the real apis and save the responses")
+    parser.add_argument("--known", nargs="*", help="locations the made up weather recognizes, all by default")
+    for upstream in ('', *UPSTREAMS):
+        prefix = f"--{upstream}-" if upstream else "--"
+        scope = f"{upstream} " if upstream else ""
+        parser.add_argument(f"{prefix}latency", type=float, help=f"seconds added to every {scope}response")
+        parser.add_argument(f"{prefix}jitter", type=float, help=f"most seconds the {scope}latency varies by")
+        parser.add_argument(f"{prefix}error-rate", type=float, help=f"share of {scope}requests that fail")
+    parser.add_argument("--error-status", type=int, default=503)
+    args = vars(parser.parse_args())
+
+    def setting(upstream: str, name: str) -> float:
+        value = args[f"{upstream}_{name}"]
+        return value if value is not None else args[name] or 0.0
+
+    faults = {
+        upstream: Fault(
+            latency=setting(upstream, 'latency'),
+            jitter=setting(upstream, 'jitter'),
+            error_rate=setting(upstream, 'error_rate'),
+            error_status=args['error_status']
+        )
+        for upstream in UPSTREAMS
+    }
+    if args['record'] and not args['recordings']:
+        parser.error("--record needs --recordings")
+
+    upstreams = FakeUpstreams(
+        recordings=args['recordings'],
+        faults=faults,
+        record=REAL_BASES if args['record'] else None,
+        known_locations=args['known']
+    )
+
+    async def serve() -> None:
+        runner = await upstreams.start(args['host'], args['port'])
+        print(f"serving on http://{args['host']}:{args['port']}")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
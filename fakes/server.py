@@ -0,0 +1,201 @@
+import asyncio
+import datetime
+import itertools
+import json
+import os
+import random
+import uuid
+
+from dataclasses import dataclass
+
+import aiohttp
+from aiohttp import web
+
+@dataclass
+class Fault:
+    """
+    Misbehaviour injected into every response of one upstream: a delay of `latency` seconds
+    give or take up to `jitter`, and a `error_status` reply for a share `error_rate` of requests.
+    """
+
+    latency: float = 0.0
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 503
+
+    async def apply(self) -> int:
+        """
+        Sleeps for this request's delay, then returns the status to fail with or `None`.
+        """
+
+        delay = self.latency + random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if random.random() < self.error_rate:
+            return self.error_status
+        return None
+
+class FakeUpstreams:
+    """
+    One aiohttp app serving the endpoints the bot's apis use:
+
+    - weather: GET /v1/forecast.json (weatherapi.com)
+    - cat: GET /v1/images/search (thecatapi.com)
+    - palm: GET /{version}/models and POST /{version}/models/{model}:generateText (PaLM REST)
+
+    Responses are replayed from a recording when it has one for the request, cycling through
+    every response recorded for it, and made up otherwise. With `record` set to a dict of real
+    base urls, requests are forwarded there instead and the responses saved to `recordings`.
+    Point the bot here with WEATHER_BASE, CAT_BASE and PALM_BASE.
+    """
+
+    def __init__(
+        self,
+        recordings: str = None,
+        faults: dict[str, Fault] = None,
+        record: dict[str, str] = None,
+        known_locations: list[str] = None
+    ):
+        self.recordings = recordings
+        self.faults = faults or {}
+        self.record = record
+        # locations the made up weather recognizes, all of them if `None`
+        self.known_locations = None if known_locations is None else {location.casefold() for location in known_locations}
+
+        self._recorded: dict[str, list[dict]] = {}
+        if recordings and os.path.exists(recordings):
+            with open(recordings) as file:
+                self._recorded = json.load(file)
+        self._replays = {key: itertools.cycle(responses) for key, responses in self._recorded.items()}
+        self._session: aiohttp.ClientSession = None
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/v1/forecast.json", self.weather)
+        app.router.add_get("/v1/images/search", self.cat)
+        app.router.add_get("/{version}/models", self.palm_models)
+        app.router.add_post("/{version}/models/{model}:generateText", self.palm_generate)
+        app.on_cleanup.append(self._cleanup)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8765) -> web.AppRunner:
+        """
+        Serves in the running event loop until the returned runner is cleaned up.
+        """
+
+        runner = web.AppRunner(self.app())
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
+
+    async def weather(self, request: web.Request) -> web.Response:
+        location = " ".join(request.query.get('q', "").split()).casefold()
+        return await self.respond('weather', request, f"weather forecast.json q={location}", lambda: self.made_up_weather(location))
+
+    async def cat(self, request: web.Request) -> web.Response:
+        limit = int(request.query.get('limit', 1))
+        return await self.respond('cat', request, "cat images/search", lambda: (200, FakeUpstreams.made_up_cats(limit)))
+
+    async def palm_models(self, request: web.Request) -> web.Response:
+        return await self.respond('palm', request, "palm models", lambda: (200, FakeUpstreams.made_up_models()))
+
+    async def palm_generate(self, request: web.Request) -> web.Response:
+        return await self.respond('palm', request, "palm generateText", lambda: (200, FakeUpstreams.made_up_text()))
+
+    async def respond(self, upstream: str, request: web.Request, key: str, make_up) -> web.Response:
+        status = await self.faults.get(upstream, Fault()).apply()
+        if status is not None:
+            return web.json_response({'error': {'code': status, 'message': "injected failure"}}, status=status)
+
+        if self.record and upstream in self.record:
+            status, body = await self.forward(upstream, request)
+            self._recorded.setdefault(key, []).append({'status': status, 'body': body})
+            self.save()
+        elif key in self._replays:
+            response = next(self._replays[key])
+            status, body = response['status'], response['body']
+        else:
+            status, body = make_up()
+        return web.json_response(body, status=status)
+
+    async def forward(self, upstream: str, request: web.Request) -> tuple[int, any]:
+        if self._session is None:
+            self._session = aiohttp.ClientSession()
+        path = request.path if upstream == 'palm' else request.path.removeprefix("/v1")
+        async with self._session.request(
+            request.method,
+            self.record[upstream].rstrip("/") + path,
+            params=request.query,
+            data=await request.read(),
+            headers={name: value for name, value in request.headers.items() if name.lower() in ('content-type', 'x-goog-api-key')}
+        ) as response:
+            return response.status, await response.json(content_type=None)
+
+    def save(self) -> None:
+        # written after every response so a recording session can be stopped at any time
+        # only the location is part of a key, so api keys never reach the file
+        with open(f"{self.recordings}.tmp", "w") as file:
+            json.dump(self._recorded, file, indent=2)
+        os.replace(f"{self.recordings}.tmp", self.recordings)
+
+    async def _cleanup(self, app: web.Application) -> None:
+        if self._session is not None:
+            await self._session.close()
+
+    def made_up_weather(self, location: str) -> tuple[int, dict]:
+        if not location or (self.known_locations is not None and location not in self.known_locations):
+            return 400, {'error': {'code': 1006, 'message': "No matching location found."}}
+
+        condition, icon = random.choice([("Sunny", 113), ("Partly cloudy", 116), ("Patchy rain possible", 176)])
+        return 200, {
+            'location': {
+                'name': location.title(),
+                'tz_id': "America/Los_Angeles",
+                'localtime': f"{datetime.datetime.now():%Y-%m-%d %H:%M}"
+            },
+            'forecast': {
+                'forecastday': [{
+                    'date': datetime.date.today().isoformat(),
+                    'day': {
+                        'maxtemp_f': round(random.uniform(55, 100), 1),
+                        'maxwind_mph': round(random.uniform(0, 35), 1),
+                        'daily_chance_of_rain': random.randint(0, 100),
+                        'condition': {
+                            'text': condition,
+                            'icon': f"//cdn.weatherapi.com/weather/64x64/day/{icon}.png"
+                        }
+                    }
+                }]
+            }
+        }
+
+    @staticmethod
+    def made_up_cats(limit: int) -> list[dict]:
+        cats = []
+        for _ in range(limit):
+            image = uuid.uuid4().hex[:9]
+            cats.append({'id': image, 'url': f"https://cdn2.thecatapi.com/images/{image}.jpg", 'width': 800, 'height': 600})
+        return cats
+
+    @staticmethod
+    def made_up_models() -> dict:
+        return {
+            'models': [{
+                'name': "models/text-bison-001",
+                'version': "001",
+                'displayName': "PaLM 2 (Legacy)",
+                'supportedGenerationMethods': ["generateText", "countTextTokens"]
+            }]
+        }
+
+    @staticmethod
+    def made_up_text() -> dict:
+        return {
+            'candidates': [{
+                'output': random.choice([
+                    "Rise and shine! Even the sun needs a coffee before it gets going.",
+                    "Every journey begins with a single step, preferably not onto a Lego.",
+                    "Be the reason someone double checks the forecast today."
+                ])
+            }]
+        }
@@ -1,11 +1,122 @@
+import atexit
+import json
+import os
+import queue
+import sys
+import threading
+
 from datetime import datetime
 
-from config import LOGGING
+from config import LOGGING, LOG_FILE, LOG_MAX_BYTES, LOG_BACKUPS, LOG_JSON, LOG_BATCH_SIZE
+
+class LogWriter:
+    """
+    Writes log records on a background thread so callers only pay for a queue put. Records are
+    written in batches, and the file is rotated once it would pass `max_bytes` or a new day
+    starts, keeping `backups` old files as `<path>.1` (newest) to `<path>.<backups>`.
+    """
+
+    def __init__(self, path: str, max_bytes: int, backups: int, as_json: bool, batch_size: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.as_json = as_json
+        self.batch_size = batch_size
+
+        self._queue = queue.Queue()
+        self._thread: threading.Thread = None
+        self._lock = threading.Lock()
+
+    def put(self, record: dict) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+                    self._thread.start()
+        self._queue.put(record)
+
+    def flush(self) -> None:
+        """
+        Blocks until every record queued so far is written.
+        """
+
+        if self._thread is not None:
+            self._queue.join()
+
+    def format(self, record: dict) -> str:
+        if self.as_json:
+            return json.dumps({key: value for key, value in record.items() if key != 'append_before'}, default=str) + "\n"
+
+        context = "".join(f" | {key}={value}" for key, value in record.items() if key not in ('time', 'level', 'msg', 'append_before'))
+        label = "Log" if record['level'] == "INFO" else record['level']
+        return f"{record.get('append_before', '')}{record['time']} | {label}: {record['msg']}{context}\n"
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                self._write(batch)
+            except OSError as err:
+                # nowhere left to log it
+                print(f"{err} - in LogWriter._write", file=sys.stderr)
+            for _ in batch:
+                self._queue.task_done()
+
+    def _write(self, batch: list[dict]) -> None:
+        text = "".join(self.format(record) for record in batch)
+        if self._should_rotate(len(text.encode()), batch[0]['time'][:10]):
+            self._rotate()
+        with open(self.path, "a") as logfile:
+            logfile.write(text)
+
+    def _should_rotate(self, incoming: int, day: str) -> bool:
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        if stat.st_size == 0:
+            return False
+        started = datetime.fromtimestamp(stat.st_mtime).date().isoformat()
+        return stat.st_size + incoming > self.max_bytes or started != day
+
+    def _rotate(self) -> None:
+        for index in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{index}"):
+                os.replace(f"{self.path}.{index}", f"{self.path}.{index + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+writer = LogWriter(LOG_FILE, max_bytes=LOG_MAX_BYTES, backups=LOG_BACKUPS, as_json=LOG_JSON, batch_size=LOG_BATCH_SIZE)
+atexit.register(writer.flush)
+
+def log(msg: any, append_before="", level="INFO", **context: any) -> None:
+    """
+    Queues a log record and returns immediately.
+
+    Parameters
+    ----------
+    msg: `any`
+        Converted with `str`, so exceptions can be logged directly.
+    append_before: `str`
+        Text written before the record in the plain text format.
+    level: `str`
+        INFO, WARNING or ERROR.
+    **context: `any`
+        Extra fields kept with the record.
+    """
 
-def log(msg: str, append_before="") -> None:
     if not LOGGING:
         return None
 
-    log_msg = append_before + f"{datetime.now()} | Log: {msg}\n"
-    with open("logs/logs.txt", "a") as logfile:
-        logfile.write(log_msg)
\ No newline at end of file
+    record = {'time': f"{datetime.now()}", 'level': level, 'msg': str(msg), **context}
+    if append_before:
+        record['append_before'] = append_before
+    writer.put(record)